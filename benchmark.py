@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, absolute_import, unicode_literals
+
+"""
+Benchmark of Sygic OfflineSpeedCams generator.
+
+Deterministic synthetic IGO feeds, offlinespeedcams.dat fixture with stock records and OfflineZone rows,
+timed scenarios of offlinespeedcams.py and results as JSON for comparison of runs over time.
+
+Copyright (C) 2017 Miszel
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import platform
+import datetime
+import subprocess
+
+import offlinespeedcams
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'offlinespeedcams.py')
+
+#IGO types with weights, 99 is not in default igotypes, x is coerced to 1
+TYPE_MIX = '1=40,2=10,3=10,4=15,5=5,8=5,15=5,99=5,x=5'
+
+#malformed lines: bad column count, bad X, bad Y
+MALFORMED_LINES = ['garbage', '1,2,3', 'a,50.0,1,50,0,0', '15.0,b,1,50,0,0']
+
+SPEEDS = ['30', '50', '50', '70', '90', '110', '0', '', '50km']
+
+#region of generated speed cameras: min latitude, min longitude, max latitude, max longitude
+REGION = (35.0, -10.0, 60.0, 30.0)
+
+
+def parse_type_mix(type_mix):
+    """
+    'TYPE=WEIGHT,...' -> (types, cumulative weights)
+    """
+
+    types, weights, total = [], [], 0
+    for item in type_mix.split(','):
+        kind, weight = item.split('=')
+        total += int(weight)
+        types.append(kind)
+        weights.append(total)
+
+    return types, weights
+
+
+def generate_igo_file(filename, rows, seed, duplicates=0.2, malformed=0.01, type_mix=TYPE_MIX, region=REGION):
+    """
+    Write IGO SpeedCamText.txt file with rows lines, the same arguments give the same file
+
+    duplicates: ratio of rows at location of previous row (some of them with different speed)
+    malformed: ratio of lines omitted by parser
+    """
+
+    rnd = random.Random(seed)
+    types, weights = parse_type_mix(type_mix)
+    locations = []
+
+    with open(filename, 'w') as igo_file:
+        igo_file.write('X,Y,TYPE,SPEED,DIRTYPE,DIRECTION\n')
+
+        for _ in range(rows):
+            if rnd.random() < malformed:
+                igo_file.write(rnd.choice(MALFORMED_LINES) + '\n')
+                continue
+
+            if locations and rnd.random() < duplicates:
+                longitude, latitude = rnd.choice(locations)
+            else:
+                longitude, latitude = round(rnd.uniform(region[1], region[3]), 5), round(rnd.uniform(region[0], region[2]), 5)
+                locations.append((longitude, latitude))
+
+            position = rnd.random() * weights[-1]
+            kind = types[next(i for i, weight in enumerate(weights) if position < weight)]
+
+            igo_file.write('{},{},{},{},{},{}\n'.format(longitude, latitude, kind, rnd.choice(SPEEDS), rnd.choice((0, 1, 2)), rnd.randrange(360)))
+
+
+def generate_igo_files(directory, files, rows, seed, duplicates=0.2, malformed=0.01, type_mix=TYPE_MIX):
+    """
+    Generate files of rows lines each into directory, return list of filenames
+    """
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    filenames = []
+    for number in range(files):
+        filename = os.path.join(directory, 'speedcam_{:02d}.txt'.format(number))
+        generate_igo_file(filename, rows, seed * 1000 + number, duplicates, malformed, type_mix)
+        filenames.append(filename)
+
+    return filenames
+
+
+def create_dat_fixture(dat_filename, stock_rows, zones, seed):
+    """
+    Create offlinespeedcams.dat with stock speed cameras (Osm = 1) and OfflineZone rows, as shipped with Sygic
+    """
+
+    if os.path.exists(dat_filename):
+        os.remove(dat_filename)
+
+    #empty dat with schema of the generator
+    offlinespeedcams.save_dat(offlinespeedcams.Speedcams(), dat_filename, 'kmh', False)
+
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(dat_filename)
+
+    def stock():
+        for number in range(stock_rows):
+            latitude, longitude = int(rnd.uniform(REGION[0], REGION[2]) * 100000), int(rnd.uniform(REGION[1], REGION[3]) * 100000)
+            yield number + 1, latitude, longitude, rnd.choice((1, 2, 4, 6)), rnd.randrange(360), rnd.choice((0, 1)), rnd.choice((30, 50, 70, 90)), 1, None, 0
+
+    def zone():
+        for number in range(zones):
+            latitude, longitude = int(rnd.uniform(REGION[0], REGION[2]) * 100000), int(rnd.uniform(REGION[1], REGION[3]) * 100000)
+            yield number + 1, 1, rnd.choice((30, 50)), latitude, longitude, latitude + rnd.randrange(100, 2000), longitude + rnd.randrange(100, 2000)
+
+    conn.executemany('INSERT INTO OfflineSpeedcam (Id, Latitude, Longitude, Type, Angle, BothWays, SpeedLimit, Osm, PairId, SpeedLimitUnits) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', stock())
+    conn.executemany('INSERT INTO OfflineZone (Id, Type, SpeedLimit, LatitudeMin, LongitudeMin, LatitudeMax, LongitudeMax) VALUES (?, ?, ?, ?, ?, ?, ?)', zone())
+    conn.commit()
+    conn.close()
+
+
+def run_scenario(name, arguments, work_dir):
+    """
+    Run offlinespeedcams.py with --stats-json, return wall time, stages and rejects
+    """
+
+    stats_filename = os.path.join(work_dir, name + '.stats.json')
+
+    started = time.time()
+    with open(os.path.join(work_dir, name + '.log'), 'w') as log:
+        subprocess.check_call([sys.executable, SCRIPT, '--stats-json', stats_filename] + arguments, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+    seconds = time.time() - started
+
+    with open(stats_filename) as stats_file:
+        stats = json.load(stats_file)
+
+    print('{:<20} {:>10.3f}s'.format(name, seconds))
+
+    return dict(stats, seconds=round(seconds, 3))
+
+
+def run_benchmark(work_dir, files, rows, stock_rows, dat2map_rows, seed, repeat=1):
+    """
+    Scenarios:
+        cold build - new parse cache, fixture dat with stock records
+        incremental - the same files (from cache) and a file with 1% new speed cameras
+        dat2map - map of dat with dat2map_rows records
+    """
+
+    if os.path.exists(work_dir):
+        shutil.rmtree(work_dir)
+    os.makedirs(work_dir)
+
+    started = time.time()
+    filenames = generate_igo_files(os.path.join(work_dir, 'feed'), files, rows, seed)
+    new_filename = os.path.join(work_dir, 'feed_new', 'speedcam_new.txt')
+    os.makedirs(os.path.dirname(new_filename))
+    generate_igo_file(new_filename, max(files * rows // 100, 1), seed * 1000 + 999, duplicates=0, malformed=0)
+
+    fixture = os.path.join(work_dir, 'fixture.dat')
+    create_dat_fixture(fixture, stock_rows, stock_rows // 100, seed)
+    map_fixture = os.path.join(work_dir, 'map_fixture.dat')
+    create_dat_fixture(map_fixture, dat2map_rows, 0, seed + 1)
+    print('Fixtures generated in {:.3f}s'.format(time.time() - started))
+
+    cache_dir = os.path.join(work_dir, 'cache')
+    dat = os.path.join(work_dir, 'offlinespeedcams.dat')
+    map_dat = os.path.join(work_dir, 'map.dat')
+
+    scenarios = {}
+    for number in range(repeat):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        shutil.copyfile(fixture, dat)
+        shutil.copyfile(map_fixture, map_dat)
+
+        results = [
+            ('cold build', run_scenario('cold_build', ['-d', dat, '--cache-dir', cache_dir] + filenames, work_dir)),
+            ('incremental', run_scenario('incremental', ['-d', dat, '--cache-dir', cache_dir] + filenames + [new_filename], work_dir)),
+            ('dat2map', run_scenario('dat2map', ['-d', map_dat, '--dat2map'], work_dir)),
+        ]
+
+        #best of repeats
+        for name, result in results:
+            if name not in scenarios or result['seconds'] < scenarios[name]['seconds']:
+                scenarios[name] = result
+
+    return {
+        'created_at': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': offlinespeedcams.numpy is not None,
+        'parameters': {'files': files, 'rows': rows, 'stock_rows': stock_rows, 'dat2map_rows': dat2map_rows, 'seed': seed, 'repeat': repeat},
+        'scenarios': scenarios,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Print time of scenarios and stages against baseline results, return list of regressions slower than threshold (ratio)
+    """
+
+    regressions = []
+
+    print('\n{:<36} {:>10} {:>10} {:>8}'.format('scenario / stage', 'baseline', 'current', 'ratio'))
+    for name, result in sorted(results['scenarios'].items()):
+        old_result = baseline['scenarios'].get(name)
+        if not old_result:
+            continue
+
+        timings = [(name, old_result['seconds'], result['seconds'])]
+        old_stages = dict((stage['stage'], stage['seconds']) for stage in old_result['stages'])
+        timings += [('  ' + stage['stage'], old_stages[stage['stage']], stage['seconds']) for stage in result['stages'] if stage['stage'] in old_stages]
+
+        for label, old_seconds, seconds in timings:
+            ratio = seconds / old_seconds if old_seconds else 1.0
+            print('{:<36} {:>10.3f} {:>10.3f} {:>8.2f}'.format(label, old_seconds, seconds, ratio))
+            #differences under 100 ms are noise
+            if ratio > threshold and seconds - old_seconds > 0.1:
+                regressions.append(label.strip())
+
+    return regressions
+
+
+if __name__ == '__main__':
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description='Benchmark of Sygic offlinespeedcams.dat generator', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-o', '--output', type=str, default='benchmark_results.json', help='Results JSON file')
+    arg_parser.add_argument('-w', '--work-dir', type=str, default='benchmark_data', help='Directory of generated feeds, fixtures and outputs, it is recreated')
+    arg_parser.add_argument('--files', type=int, default=8, help='Number of generated IGO files')
+    arg_parser.add_argument('--rows', type=int, default=100000, help='Lines per generated IGO file')
+    arg_parser.add_argument('--stock-rows', type=int, default=50000, help='Stock speed cameras (Osm = 1) in dat fixture, OfflineZone rows are 1%% of it')
+    arg_parser.add_argument('--dat2map-rows', type=int, default=1000000, help='Speed cameras in dat of --dat2map scenario')
+    arg_parser.add_argument('--seed', type=int, default=1, help='Seed of generated data')
+    arg_parser.add_argument('--repeat', type=int, default=1, help='Run scenarios N times, keep the fastest')
+    arg_parser.add_argument('--compare', type=str, metavar='FILE', help='Compare with previous results, exit status 1 on regression')
+    arg_parser.add_argument('--threshold', type=float, default=1.2, help='Regression: slower than baseline * THRESHOLD')
+
+    args = arg_parser.parse_args()
+
+    results = run_benchmark(os.path.abspath(args.work_dir), args.files, args.rows, args.stock_rows, args.dat2map_rows, args.seed, args.repeat)
+
+    with open(args.output, 'w') as output_file:
+        json.dump(results, output_file, indent=2, sort_keys=True)
+
+    print('\nResults: ' + args.output)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+
+        if regressions:
+            print('\nRegressions: ' + ', '.join(regressions))
+            sys.exit(1)
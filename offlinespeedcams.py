@@ -31,476 +31,2667 @@ import sqlite3
 import os
 import re
 import datetime
+import time
+import array
+import multiprocessing
+import itertools
+import operator
+import math
+import hashlib
+import json
+import struct
+import glob
+import heapq
+import tempfile
+import contextlib
+import sys
+import fnmatch
+import mmap
+import gzip
+import bz2
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+izip = getattr(itertools, 'izip', zip)
+
+#python 2 array has no 64-bit typecode, lists are used there
+try:
+    INT64_TYPECODE = array.array(str('q')).typecode
+except ValueError:
+    INT64_TYPECODE = None
+
+#record: [latitude, longitude, speed, type, angle, both_ways]
+LATITUDE, LONGITUDE, SPEED, KIND, ANGLE, BOTH_WAYS = range(6)
+
+INT32_MAX = 2 ** 31 - 1
+
+#sygic coordinates are degrees * 100000, meters per unit of latitude
+METERS_PER_UNIT = 1.1131949
+
+re_first_number = re.compile(r'\d+|$')
+
+#cache entry: header (magic, content sha1, igo types sha1, size, mtime, count, path length, rejects length), path, rejects counts (JSON), Speedcams columns
+CACHE_MAGIC = b'OSC3'
+CACHE_HEADER = struct.Struct(str('<4s20s20sqdIHI'))
+
+#OSM enforcement / speed_camera tag -> sygic type (as default igotypes: fixed 1, red light 2, section 4, mobile 5, red light and speed 6)
+OSM_TYPES = {'maxspeed': 1, 'traffic_signals': 2, 'average_speed': 4, 'mobile': 5}
+
+#OSM direction of compass points in degrees
+OSM_DIRECTIONS = dict((point, i * 22.5) for i, point in enumerate(['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']))
+
+KMH_PER_MPH = 1.609344
+
+#sygic RADAR_STATIC_AVERAGE_SPEED, start and end of a section are linked by PairId
+AVERAGE_SPEED_TYPE = 4
+#candidate ends of a section considered for each camera
+PAIR_CANDIDATES = 8
+
+#records per block of temporary sorted run
+RUN_BLOCK = 4096
+#approximate peak memory in bytes per record while sorting a run
+RUN_RECORD_SIZE = 100
+
+#snapshot: header (magic, version, count, record size, type map length), type map (JSON), records sorted by latitude, longitude, speed
+SNAPSHOT_MAGIC = b'OSCB'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct(str('<4sHIHI'))
+SNAPSHOT_RECORD = struct.Struct(str('<6i'))
+
+#map: single points from this zoom level, clusters (cells of 1/2**MAP_CLUSTER_SHIFT tile) below
+MAP_DETAIL_ZOOM = 12
+MAP_CLUSTER_SHIFT = 2
+#cluster level is written only with at most this part of points of the finer written level, the page uses that one instead
+MAP_CLUSTER_RATIO = 0.5
+
+class Speedcams(object):
+    """
+    Columnar store of speed cameras in sygic format, one array of ints per field:
+    latitude, longitude, speed, type, angle, both_ways
+
+    Records are read as (latitude, longitude, speed, type, angle, both_ways) tuples
+    """
+
+    def __init__(self, records=()):
+        self.columns = tuple(array.array(str('i')) for _ in range(6))
+        self.extend(records)
+
+    def __len__(self):
+        return len(self.columns[LATITUDE])
+
+    def __iter__(self):
+        return izip(*self.columns)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(range(len(self))[index])
+        return tuple(column[index] for column in self.columns)
+
+    def append(self, sc):
+        for column, value in zip(self.columns, sc):
+            column.append(value)
+
+    def extend(self, records):
+        if isinstance(records, Speedcams):
+            for column, other in zip(self.columns, records.columns):
+                column.extend(other)
+        else:
+            for sc in records:
+                self.append(sc)
+
+    def take(self, indexes):
+        """
+        New Speedcams with records at indexes
+        """
+
+        if not isinstance(indexes, (list, array.array)):
+            indexes = list(indexes)
+
+        speedcams = Speedcams()
+        speedcams.columns = tuple(array.array(str('i'), [column[i] for i in indexes]) for column in self.columns)
+        return speedcams
+
+    def sort(self):
+        """
+        Stable sort by latitude, longitude, speed
+        """
+
+        if len(self) < 2:
+            return
+
+        if numpy is not None:
+            latitude, longitude, speed = [numpy.frombuffer(self.columns[c], dtype=numpy.intc) for c in (LATITUDE, LONGITUDE, SPEED)]
+            order = numpy.lexsort((speed, longitude, latitude))
+            self.columns = tuple(array.array(str('i'), numpy.frombuffer(column, dtype=numpy.intc)[order].tobytes()) for column in self.columns)
+        else:
+            #lexsort: stable sorts from the last key to the first one
+            order = list(range(len(self)))
+            for c in (SPEED, LONGITUDE, LATITUDE):
+                order.sort(key=self.columns[c].__getitem__)
+            self.columns = self.take(order).columns
+
+    def within(self, bbox):
+        """
+        New Speedcams with records in bbox (min latitude, min longitude, max latitude, max longitude) in degrees
+        """
+
+        min_latitude, min_longitude, max_latitude, max_longitude = [int(round(value * 100000)) for value in bbox]
+
+        if numpy is not None and len(self):
+            latitude, longitude = [numpy.frombuffer(self.columns[c], dtype=numpy.intc) for c in (LATITUDE, LONGITUDE)]
+            indexes = numpy.flatnonzero((latitude >= min_latitude) & (latitude <= max_latitude) & (longitude >= min_longitude) & (longitude <= max_longitude))
+            return self.take(array.array(str('i'), indexes.astype(numpy.intc).tobytes()))
+
+        return self.take(array.array(str('i'), (i for i, (latitude, longitude) in enumerate(izip(self.columns[LATITUDE], self.columns[LONGITUDE]))
+                                                if min_latitude <= latitude <= max_latitude and min_longitude <= longitude <= max_longitude)))
+
+
+    def locations(self):
+        """
+        Iterator of (latitude, longitude)
+        """
+
+        return izip(self.columns[LATITUDE], self.columns[LONGITUDE])
+
+    def _location_codes(self):
+        latitude, longitude = [numpy.frombuffer(self.columns[c], dtype=numpy.intc).astype(numpy.int64) for c in (LATITUDE, LONGITUDE)]
+        return (latitude << 32) | (longitude & 0xFFFFFFFF)
+
+    def at(self, other):
+        """
+        New Speedcams with records at locations of records of other Speedcams
+        """
+
+        if numpy is not None and len(self) and len(other):
+            indexes = numpy.flatnonzero(numpy.isin(self._location_codes(), other._location_codes()))
+            return self.take(array.array(str('i'), indexes.astype(numpy.intc).tobytes()))
+
+        locations = set(other.locations())
+        return self.take(array.array(str('i'), (i for i, location in enumerate(self.locations()) if location in locations)))
+
+
+class Rejects(object):
+    """
+    Counts of omitted or coerced source rows by reason, details (filename; line; reason; values) are kept only if wanted
+
+    details: False - counts only, True - detail lines in memory (of one file, in pool workers), open file - detail lines
+    are written to it, so memory does not grow with the feed
+    """
+
+    def __init__(self, details=False):
+        self.counts = {}
+        self.details = [] if details is True else None
+        self.details_file = details if details not in (True, False) else None
+
+    @property
+    def has_details(self):
+        return self.details is not None or self.details_file is not None
+
+    def _add_line(self, line):
+        if self.details_file is not None:
+            self.details_file.write(line + '\n')
+        elif self.details is not None:
+            self.details.append(line)
+
+    def add(self, reason, filename, line_num, *values):
+        self.counts[reason] = self.counts.get(reason, 0) + 1
+        if self.has_details:
+            self._add_line('; '.join(str(value) for value in (filename, line_num, reason) + values))
+
+    def add_counts(self, counts):
+        for reason, count in counts.items():
+            self.counts[reason] = self.counts.get(reason, 0) + count
+
+    def update(self, other):
+        self.add_counts(other.counts)
+        if self.has_details:
+            for line in other.details or ():
+                self._add_line(line)
+
+
+def _reset_peak_memory():
+    """
+    Start peak memory of this process from now (Linux), return False where it can not be reset
+    """
+
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def _peak_memory_mb(who=None):
+    """
+    Peak RSS of this process (since _reset_peak_memory on Linux), or of the largest finished child process (who=RUSAGE_CHILDREN)
+    """
+
+    if who is None:
+        try:
+            with open('/proc/self/status') as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        return round(int(line.split()[1]) / 1024.0, 1)
+        except (IOError, OSError):
+            pass
+
+    if resource is None:
+        return None
+
+    #ru_maxrss is in kilobytes, on macOS in bytes
+    return round(resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0), 1)
+
+
+def _max_memory(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+
+class Stats(object):
+    """
+    Per-stage wall time, rows, rows/sec and peak memory of the pipeline, Rejects of source rows
+
+    peak_memory_mb: peak RSS of this process during the stage (Linux), elsewhere since start of the process
+    (peak_memory_scope 'process'); workers_peak_memory_mb: largest finished worker process (--jobs) so far
+
+    reject_details: see Rejects
+    """
+
+    def __init__(self, reject_details=False):
+        self.stages = []
+        self.rejects = Rejects(reject_details)
+        self.running = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Measure stage, caller sets stage['rows']; stages can be nested (e.g. stream consumed in another stage)
+        """
+
+        #peak so far belongs to running stages, before it is reset for this one
+        peak = _peak_memory_mb()
+        for running in self.running:
+            running['peak_memory_mb'] = _max_memory(running['peak_memory_mb'], peak)
+
+        stage = {'stage': name, 'rows': 0, 'peak_memory_mb': None, 'peak_memory_scope': 'stage' if _reset_peak_memory() else 'process'}
+        self.running.append(stage)
+        started = time.time()
+        try:
+            yield stage
+        finally:
+            self.running.remove(stage)
+        stage['seconds'] = round(time.time() - started, 3)
+        stage['rows_per_sec'] = int(stage['rows'] / stage['seconds']) if stage['seconds'] else None
+        stage['peak_memory_mb'] = _max_memory(stage['peak_memory_mb'], _peak_memory_mb())
+        stage['workers_peak_memory_mb'] = _peak_memory_mb(resource.RUSAGE_CHILDREN) if resource is not None else None
+        self.stages.append(stage)
+
+    def report(self):
+        return {'stages': self.stages, 'rejects': self.rejects.counts}
+
+    def print_report(self):
+        print('\n{:<24} {:>10} {:>12} {:>12} {:>10} {:>10}'.format('stage', 'seconds', 'rows', 'rows/sec', 'peak MB', 'workers MB'))
+        for stage in self.stages:
+            print('{stage:<24} {seconds:>10.3f} {rows:>12,} {rate:>12} {memory:>10} {workers:>10}'.format(
+                rate='{:,}'.format(stage['rows_per_sec']) if stage['rows_per_sec'] is not None else '-',
+                memory=stage['peak_memory_mb'] if stage['peak_memory_mb'] is not None else '-',
+                workers=stage['workers_peak_memory_mb'] or '-', **stage))
+
+        if any(stage['peak_memory_scope'] == 'process' for stage in self.stages):
+            print('peak MB: since start of the process; workers MB: largest finished worker process so far')
+        else:
+            print('peak MB: of the stage; workers MB: largest finished worker process so far')
+
+        print('\n{:<24} {:>10}'.format('rejected / coerced', 'rows'))
+        for reason, count in sorted(self.rejects.counts.items()):
+            print('{:<24} {:>10,}'.format(reason, count))
+
+
+def igo_file2points(filename, igo_types, debug, rejects=None):
+    """
+    Parse one IGO SpeedCamText.txt file, return Speedcams in sygic format
+    """
+
+    return Speedcams(iter_igo_file(filename, igo_types, debug, rejects))
+
+
+def iter_igo_file(filename, igo_types, debug, rejects=None):
+    """
+    Parse one IGO SpeedCamText.txt file, yield records in sygic format
+
+    rejects: Rejects to count omitted and coerced rows
+    """
+
+    if not os.path.exists(filename):
+        return
+
+    reject = rejects.add if rejects is not None else lambda reason, filename, line_num, *values: None
+
+    if debug:
+        print('\n' + filename)
+
+    with (open(filename, 'rb') if bytes is str else open(filename, mode='r', newline='')) as csvfile:
+        speedcam_csv = csv.reader(csvfile, delimiter=str(','), quotechar=str('"'))
+
+        for row in speedcam_csv:
+            #omit header
+            if speedcam_csv.line_num == 1 and row[0] == 'X':
+                continue
+
+            #omit bad lines
+            if len(row) != 6:
+                reject('bad column count', filename, speedcam_csv.line_num, len(row))
+                continue
+
+            longitude, latitude, kind, speed, dirtype, angle = row[0], row[1], row[2], row[3], row[4], row[5]
+
+            #is latitude a float? if not, omit record
+            try:
+                latitude = float(latitude)
+            except ValueError:
+                reject('bad Y', filename, speedcam_csv.line_num, latitude)
+                continue
+
+            #is longitude a float? if not, omit record
+            try:
+                longitude = float(longitude)
+            except ValueError:
+                reject('bad X', filename, speedcam_csv.line_num, longitude)
+                continue
+
+            #is location on the globe? if not (also nan), omit record, it would not fit sygic int columns
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                reject('out of range', filename, speedcam_csv.line_num, row[1], row[0])
+                continue
+
+            #is speed a integer? if not, try to find or set zero
+            if not speed.isdigit():
+                #try to find first number in string
+                speed = re_first_number.search(speed).group()
+                if not speed.isdigit():
+                    speed = 0
+                reject('speed coerced', filename, speedcam_csv.line_num, row[3], speed)
+
+            if igo_types:
+                #is type a integer? if not, set as normal speed camera - 1
+                if not kind.isdigit():
+                    kind = '1'
+                    reject('type coerced', filename, speedcam_csv.line_num, row[2], kind)
+
+                if kind in igo_types:
+                    kind = igo_types[kind]
+                else:
+                    reject('unmapped type', filename, speedcam_csv.line_num, row[2])
+                    continue
+            else:
+                kind = '1'
+
+            #are dirtype and direction integers? if not, omit record
+            try:
+                dirtype, angle = int(dirtype), int(angle)
+            except ValueError:
+                reject('bad direction', filename, speedcam_csv.line_num, row[4], row[5])
+                continue
+
+            #igo dirtype equals 0 or 2: both ways; dirtype equals 1: single direction
+            both_ways = 0 if dirtype == 1 else 1
+
+            speed, kind = int(speed), int(kind)
+
+            if max(abs(speed), abs(kind), abs(angle)) > INT32_MAX:
+                reject('out of range', filename, speedcam_csv.line_num, row[2], row[3], row[5])
+                continue
+
+            #convert to sygic format
+            yield int(latitude * 100000), int(longitude * 100000), speed, kind, angle, both_ways
+
+
+def _open_osm(filename):
+    if filename.endswith('.bz2'):
+        return bz2.BZ2File(filename, 'rb')
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def _osm_speed(value, unit):
+    """
+    OSM maxspeed ('50', '30 mph', 'none', 'RU:urban', ...) -> speed in unit, None if there is no number
+    """
+
+    number = re_first_number.search(value).group()
+    if not number:
+        return None
+
+    speed = int(number)
+    if 'mph' in value and unit == 'kmh':
+        speed = int(round(speed * KMH_PER_MPH))
+    elif 'mph' not in value and unit == 'mph':
+        speed = int(round(speed / KMH_PER_MPH))
+
+    return speed
+
+
+def _osm_angle(value):
+    """
+    OSM direction (degrees or compass point, first of ranges and lists) -> angle, None for forward / backward / unknown
+    """
+
+    value = value.strip().split(';')[0].split('-')[0].strip().upper()
+    if value in OSM_DIRECTIONS:
+        return int(OSM_DIRECTIONS[value])
+
+    try:
+        return int(round(float(value))) % 360
+    except ValueError:
+        return None
+
+
+def iter_osm_file(filename, unit, debug, rejects=None):
+    """
+    Stream parse OSM XML (also .bz2 / .gz) file, yield highway=speed_camera nodes in sygic format
+
+    maxspeed -> speed (converted to unit), enforcement / speed_camera -> type, direction -> angle and one way.
+    Parsed elements are cleared, so memory use does not depend on size of the file.
+    Enforcement relations are not resolved, it would need positions of all nodes.
+    """
+
+    if not os.path.exists(filename):
+        return
+
+    reject = rejects.add if rejects is not None else lambda reason, filename, line_num, *values: None
+
+    if debug:
+        print('\n' + filename)
+
+    with _open_osm(filename) as osm_file:
+        root = None
+        tags = {}
+
+        for event, element in ElementTree.iterparse(osm_file, events=(str('start'), str('end'))):
+            if root is None:
+                root = element
+                continue
+
+            if event == 'start':
+                continue
+
+            if element.tag == 'tag':
+                tags[element.get('k')] = element.get('v')
+                continue
+
+            if element.tag == 'node' and tags.get('highway') == 'speed_camera':
+                node_id = element.get('id')
+
+                try:
+                    latitude, longitude = float(element.get('lat')), float(element.get('lon'))
+                    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                        raise ValueError
+                except (TypeError, ValueError):
+                    reject('bad location', filename, node_id, element.get('lat'), element.get('lon'))
+                    latitude = None
+
+                if latitude is not None:
+                    speed = 0
+                    value = tags.get('maxspeed') or tags.get('maxspeed:forward') or tags.get('maxspeed:backward')
+                    if value:
+                        speed = _osm_speed(value, unit)
+                        if speed is None:
+                            speed = 0
+                            reject('speed coerced', filename, node_id, value, speed)
+
+                    enforcement = set((tags.get('enforcement', '') + ';' + tags.get('speed_camera', '')).split(';'))
+                    if 'traffic_signals' in enforcement:
+                        kind = 6 if 'maxspeed' in enforcement or speed else OSM_TYPES['traffic_signals']
+                    elif 'average_speed' in enforcement:
+                        kind = OSM_TYPES['average_speed']
+                    elif 'mobile' in enforcement or tags.get('mobile') == 'yes':
+                        kind = OSM_TYPES['mobile']
+                    else:
+                        kind = OSM_TYPES['maxspeed']
+
+                    angle, both_ways = 0, 1
+                    value = tags.get('direction') or tags.get('camera:direction')
+                    if value:
+                        direction = _osm_angle(value)
+                        if direction is None:
+                            if value not in ('both', 'forward', 'backward'):
+                                reject('direction coerced', filename, node_id, value)
+                        else:
+                            angle, both_ways = direction, 0
+
+                    yield int(latitude * 100000), int(longitude * 100000), speed, kind, angle, both_ways
+
+            if element.tag in ('node', 'way', 'relation'):
+                tags = {}
+                #drop parsed elements
+                root.clear()
+
+
+def _file_digest(filename):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _igo_types_digest(igo_types):
+    return hashlib.sha1(json.dumps(sorted(igo_types.items()) if igo_types else None).encode('utf-8')).digest()
+
+
+def _cache_entry(cache_dir, filename):
+    return os.path.join(cache_dir, hashlib.sha1(filename.encode('utf-8')).hexdigest() + '.bin')
+
+
+def _read_cache_header(entry):
+    try:
+        with open(entry, 'rb') as f:
+            magic, content_digest, types_digest, size, mtime, count, path_length, rejects_length = CACHE_HEADER.unpack(f.read(CACHE_HEADER.size))
+            if magic != CACHE_MAGIC:
+                return None
+            path = f.read(path_length).decode('utf-8')
+            rejects = json.loads(f.read(rejects_length).decode('utf-8'))
+    except (IOError, OSError, struct.error, ValueError):
+        return None
+
+    return dict(content_digest=content_digest, types_digest=types_digest, size=size, mtime=mtime, count=count, path=path, rejects=rejects,
+                offset=CACHE_HEADER.size + path_length + rejects_length)
+
+
+def _read_cache(entry, header):
+    speedcams = Speedcams()
+    with open(entry, 'rb') as f:
+        f.seek(header['offset'])
+        for column in speedcams.columns:
+            column.fromfile(f, header['count'])
+
+    #mark as recently used for eviction
+    os.utime(entry, None)
+
+    return speedcams
+
+
+def _write_cache(entry, filename, stat, content_digest, types_digest, speedcams, rejects):
+    path = filename.encode('utf-8')
+    rejects = json.dumps(rejects, sort_keys=True).encode('utf-8')
+
+    tmp_entry = entry + '.{}.tmp'.format(os.getpid())
+    with open(tmp_entry, 'wb') as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, content_digest, types_digest, stat.st_size, stat.st_mtime, len(speedcams), len(path), len(rejects)))
+        f.write(path)
+        f.write(rejects)
+        for column in speedcams.columns:
+            column.tofile(f)
+
+    if os.path.exists(entry) and not hasattr(os, 'replace'):
+        os.remove(entry)
+    getattr(os, 'replace', os.rename)(tmp_entry, entry)
+
+
+def file2points(filename, igo_types, debug, cache_dir=None, rejects=None):
+    """
+    Parse one IGO file with cache of parsed records, return (records, loaded from cache)
+
+    Cache entry is valid for the same path and igo types, when size and mtime or content hash of the file are the same,
+    counts of rejected rows are kept in the entry, details are not
+    """
+
+    if not cache_dir or not os.path.isfile(filename):
+        return igo_file2points(filename, igo_types, debug, rejects), False
+
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            if not os.path.isdir(cache_dir):
+                raise
+
+    stat = os.stat(filename)
+    entry = _cache_entry(cache_dir, filename)
+    types_digest = _igo_types_digest(igo_types)
+    content_digest = None
+
+    header = _read_cache_header(entry)
+    if header and header['path'] == filename and header['types_digest'] == types_digest:
+        if header['size'] == stat.st_size and header['mtime'] == stat.st_mtime:
+            if rejects is not None:
+                rejects.add_counts(header['rejects'])
+            return _read_cache(entry, header), True
+
+        #touched, but maybe not changed
+        content_digest = _file_digest(filename)
+        if header['content_digest'] == content_digest:
+            if rejects is not None:
+                rejects.add_counts(header['rejects'])
+            speedcams = _read_cache(entry, header)
+            _write_cache(entry, filename, stat, content_digest, types_digest, speedcams, header['rejects'])
+            return speedcams, True
+
+    if content_digest is None:
+        content_digest = _file_digest(filename)
+
+    #rejects of this file only, for the cache entry
+    file_rejects = Rejects(rejects is not None and rejects.has_details)
+    speedcams = igo_file2points(filename, igo_types, debug, file_rejects)
+    if rejects is not None:
+        rejects.update(file_rejects)
+
+    _write_cache(entry, filename, stat, content_digest, types_digest, speedcams, file_rejects.counts)
+
+    return speedcams, False
+
+
+def evict_cache(cache_dir, max_size):
+    """
+    Remove cache entries of not existing files, then least recently used ones above max_size bytes
+    """
+
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return
+
+    entries = []
+    for entry in glob.glob(os.path.join(cache_dir, '*.bin')):
+        header = _read_cache_header(entry)
+        if header is None or not os.path.exists(header['path']):
+            os.remove(entry)
+            continue
+        stat = os.stat(entry)
+        entries.append((stat.st_mtime, stat.st_size, entry))
+
+    entries.sort(reverse=True)
+
+    total_size = 0
+    for mtime, size, entry in entries:
+        total_size += size
+        if total_size > max_size:
+            os.remove(entry)
+
+
+def export_snapshot(speedcams, filename, types):
+    """
+    Write sorted speedcams to binary snapshot: fixed width little-endian records, which can be memory-mapped
+
+    types: type map used to build the records (igotypes), stored in the header
+    """
+
+    type_map = json.dumps(types, sort_keys=True).encode('utf-8')
+    #records are aligned to 8 bytes, JSON ignores trailing spaces
+    type_map += b' ' * (-(SNAPSHOT_HEADER.size + len(type_map)) % 8)
+
+    tmp_filename = filename + '.{}.tmp'.format(os.getpid())
+    with open(tmp_filename, 'wb') as snapshot_file:
+        snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(speedcams), SNAPSHOT_RECORD.size, len(type_map)))
+        snapshot_file.write(type_map)
+
+        if numpy is not None and isinstance(speedcams, Speedcams):
+            #interleave columns into rows
+            snapshot_file.write(numpy.column_stack([numpy.frombuffer(column, dtype=numpy.intc) for column in speedcams.columns]).astype(str('<i4')).tobytes())
+        else:
+            for sc in speedcams:
+                snapshot_file.write(SNAPSHOT_RECORD.pack(*sc))
+
+    if os.path.exists(filename) and not hasattr(os, 'replace'):
+        os.remove(filename)
+    getattr(os, 'replace', os.rename)(tmp_filename, filename)
+
+
+class Snapshot(object):
+    """
+    Memory-mapped binary snapshot written by export_snapshot, records are unpacked on access, nothing is loaded
+
+    Records are sorted by latitude, so range of latitudes is found by binary search
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+        with open(filename, 'rb') as snapshot_file:
+            header = snapshot_file.read(SNAPSHOT_HEADER.size)
+            if len(header) != SNAPSHOT_HEADER.size:
+                raise ValueError('{}: not a speedcams snapshot'.format(filename))
+
+            magic, version, self.count, record_size, type_map_length = SNAPSHOT_HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC or record_size != SNAPSHOT_RECORD.size:
+                raise ValueError('{}: not a speedcams snapshot'.format(filename))
+            if version != SNAPSHOT_VERSION:
+                raise ValueError('{}: snapshot version {} is not supported'.format(filename, version))
+
+            self.types = json.loads(snapshot_file.read(type_map_length).decode('utf-8'))
+            self.offset = SNAPSHOT_HEADER.size + type_map_length
+
+            if os.fstat(snapshot_file.fileno()).st_size < self.offset + self.count * SNAPSHOT_RECORD.size:
+                raise ValueError('{}: snapshot is truncated'.format(filename))
+
+            #empty file cannot be mapped
+            self.buffer = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('snapshot index out of range')
+        return SNAPSHOT_RECORD.unpack_from(self.buffer, self.offset + index * SNAPSHOT_RECORD.size)
+
+    def __iter__(self):
+        return self.iter_range(0, self.count)
+
+    def iter_range(self, start, stop):
+        for position in range(self.offset + start * SNAPSHOT_RECORD.size, self.offset + stop * SNAPSHOT_RECORD.size, SNAPSHOT_RECORD.size):
+            yield SNAPSHOT_RECORD.unpack_from(self.buffer, position)
+
+    def bisect_latitude(self, latitude):
+        """
+        Index of the first record with latitude >= latitude (sygic units)
+        """
+
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from(str('<i'), self.buffer, self.offset + middle * SNAPSHOT_RECORD.size)[0] < latitude:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def within(self, bbox):
+        """
+        Yield records in bbox (min latitude, min longitude, max latitude, max longitude) in degrees
+        """
+
+        min_latitude, min_longitude, max_latitude, max_longitude = [int(round(value * 100000)) for value in bbox]
+
+        for sc in self.iter_range(self.bisect_latitude(min_latitude), self.bisect_latitude(max_latitude + 1)):
+            if min_longitude <= sc[LONGITUDE] <= max_longitude:
+                yield sc
+
+    def to_speedcams(self):
+        if numpy is None or not self.count:
+            return Speedcams(self)
+
+        rows = numpy.frombuffer(self.buffer, dtype=str('<i4'), count=self.count * 6, offset=self.offset).reshape(self.count, 6)
+        speedcams = Speedcams()
+        speedcams.columns = tuple(array.array(str('i'), rows[:, c].astype(numpy.intc).tobytes()) for c in range(6))
+        return speedcams
+
+
+class _ListdirEntry(object):
+    """
+    os.DirEntry of os.listdir, when scandir is not available
+    """
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def is_file(self):
+        return os.path.isfile(self.path)
+
+    def is_symlink(self):
+        #stat of each file is needed for inode anyway
+        return True
+
+    def stat(self):
+        return os.stat(self.path)
+
+    def inode(self):
+        return self.stat().st_ino
+
+
+def _file_key(stat, filename):
+    #inode is 0 where it is not known, e.g. for FAT
+    return (stat.st_dev, stat.st_ino) if stat.st_ino else os.path.realpath(filename)
+
+
+def _walk_files(directory, mask, visited):
+    """
+    Yield (path, key) of files matching mask in directory tree, depth first in directory order,
+    hidden files and directories are skipped, directories reached again (by links) are skipped
+    """
+
+    try:
+        stat = os.stat(directory)
+        if _file_key(stat, directory) in visited:
+            return
+        visited.add(_file_key(stat, directory))
+
+        entries = list(scandir(directory)) if scandir is not None else [_ListdirEntry(directory, name) for name in os.listdir(directory)]
+    except OSError:
+        return
+
+    for entry in entries:
+        if entry.name.startswith('.'):
+            continue
+
+        try:
+            if entry.is_dir():
+                for item in _walk_files(entry.path, mask, visited):
+                    yield item
+            elif fnmatch.fnmatch(entry.name, mask) and entry.is_file():
+                #entries of a directory are on its device, inode of DirEntry is known without stat, except of links
+                if entry.is_symlink():
+                    yield os.path.normpath(entry.path), _file_key(entry.stat(), entry.path)
+                else:
+                    yield os.path.normpath(entry.path), (stat.st_dev, entry.inode()) if entry.inode() else os.path.realpath(entry.path)
+        except OSError:
+            #removed meanwhile or not accessible
+            continue
+
+
+def iter_source_files(names):
+    """
+    Yield source files of names as they are found: files, directories (whole tree) or masks with * ? [ (searched in the tree
+    of their directory), a missing file is reported
+
+    Each file is yielded once, even if it is reached by several names, masks or links (by device and inode or real path)
+    """
+
+    seen = set()
+
+    for name in names:
+        name = os.path.abspath(os.path.normpath(name))
+
+        if os.path.isfile(name):
+            files = [(name, _file_key(os.stat(name), name))]
+        elif os.path.isdir(name):
+            files = _walk_files(name, '*.*', set())
+        elif any(char in os.path.basename(name) for char in '*?['):
+            files = _walk_files(os.path.dirname(name), os.path.basename(name), set())
+        else:
+            print('\nSource file not found: {}'.format(name))
+            files = ()
+
+        for filename, key in files:
+            if key not in seen:
+                seen.add(key)
+                yield filename
+
+
+def iter_prefetched(iterable, size=1024):
+    """
+    Iterate iterable in background thread, so slow discovery (e.g. on network file system) overlaps with parsing
+
+    The thread is started with the first item requested, so worker processes forked before that do not inherit it
+    """
+
+    items = queue.Queue(size)
+    done = object()
+    failures = []
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        except Exception as e:
+            failures.append(e)
+        finally:
+            items.put(done)
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+
+    while True:
+        item = items.get()
+        if item is done:
+            break
+        yield item
+
+    if failures:
+        raise failures[0]
+
+
+def _igo_file_worker(task):
+    """
+    Pool worker: parse one file, return Speedcams (arrays of ints are cheap to pickle) and Rejects
+    """
+
+    filename, igo_types, debug, cache_dir, reject_details = task
+
+    started = time.time()
+    rejects = Rejects(reject_details)
+    speedcams, cached = file2points(filename, igo_types, debug, cache_dir, rejects)
+
+    return filename, speedcams, cached, rejects, time.time() - started
+
+
+def igo2sygic(files, igo_types, debug, jobs=1, cache_dir=None, stats=None):
+    """
+    SpeedCamText.txt
+
+    header line: X, Y, TYPE, SPEED, DIRTYPE, DIRECTION
+
+    X = longitude
+    Y = latitude
+    TYPE = type of speed camera ( 1 - fixed speed camera locations; 2 - combined red light and speed cameras; 3 - fixed red light camera locations; 4 - section camera positions; 5 - lasers, hand-held radars and other mobile speed camera locations; 6 - railway crossing; 7 - not constant mobile locations)
+    SPEED = speed limit in km/h
+    DIRTYPE = type of direction of the speedcam (0-all directions; 1-one direction; 2-both directions)
+    DIRECTION = direction in degrees (0-North; 90-East)
+
+    jobs > 1 parses files in worker processes, result is the same as serial one
+    cache_dir: directory for parsed files cache, None - no cache
+    stats: Stats for parse, sort and dedup stages
+    """
+
+    stats = stats or Stats()
+
+    speedcams = Speedcams()
+
+    with stats.stage('parse') as stage:
+        _parse_files(files, igo_types, debug, jobs, cache_dir, stats.rejects, lambda filename, points: speedcams.extend(points))
+        stage['rows'] = len(speedcams)
+
+    return _sort_and_dedup(speedcams, debug, stats)
+
+
+def osm2sygic(files, unit, debug, stats=None):
+    """
+    OSM XML files (planet extracts), highway=speed_camera nodes
+
+    stats: Stats for parse, sort and dedup stages
+    """
+
+    stats = stats or Stats()
+
+    speedcams = Speedcams()
+
+    with stats.stage('parse') as stage:
+        for filename in files:
+            speedcams.extend(iter_osm_file(filename, unit, debug, stats.rejects))
+        stage['rows'] = len(speedcams)
+
+    return _sort_and_dedup(speedcams, debug, stats)
+
+
+def _sort_and_dedup(speedcams, debug, stats):
+    #sort by latitude, longitude, speed
+    with stats.stage('sort') as stage:
+        speedcams.sort()
+        stage['rows'] = len(speedcams)
+
+    print('\nSpeedCameras all: {:,}'.format(len(speedcams)))
+
+    with stats.stage('dedup') as stage:
+        speedcams = eliminate_duplicates(speedcams, debug)
+        stage['rows'] = len(speedcams)
+
+    return speedcams
+
+
+def _parse_files(files, igo_types, debug, jobs, cache_dir, rejects, add_points):
+    """
+    Parse files (in worker processes for jobs > 1), call add_points(filename, Speedcams) in order of files
+
+    files can be an iterator, files are parsed while it is consumed
+    """
+
+    cached_files = 0
+    count = 0
+
+    if isinstance(files, list):
+        jobs = min(jobs, len(files))
+
+    if jobs > 1:
+        started = time.time()
+
+        #parse files in worker processes, merge results in the same order as the serial loop
+        pool = multiprocessing.Pool(jobs)
+        try:
+            serial_time = 0
+            for filename, points, cached, file_rejects, elapsed in pool.imap(_igo_file_worker, ((filename, igo_types, debug, cache_dir, rejects.has_details) for filename in files)):
+                count += 1
+                serial_time += elapsed
+                cached_files += cached
+                rejects.update(file_rejects)
+                add_points(filename, points)
+        finally:
+            pool.close()
+            pool.join()
+
+        parse_time = time.time() - started
+
+        print('\nParsed {} files with {} jobs in {:.2f}s (serial {:.2f}s, speedup {:.2f}x)'.format(count, jobs, parse_time, serial_time, serial_time / parse_time if parse_time else 1.0))
+    else:
+        for filename in files:
+            count += 1
+            points, cached = file2points(filename, igo_types, debug, cache_dir, rejects)
+            add_points(filename, points)
+            cached_files += cached
+
+    if cache_dir:
+        print('\nFiles loaded from cache: {} of {}'.format(cached_files, count))
+
+
+def _write_run(speedcams):
+    """
+    Sort speedcams and spill them to temporary file as rows of ints
+    """
+
+    speedcams.sort()
+
+    run = tempfile.TemporaryFile()
+    for start in range(0, len(speedcams), RUN_BLOCK):
+        array.array(str('i'), itertools.chain.from_iterable(izip(*[column[start:start + RUN_BLOCK] for column in speedcams.columns]))).tofile(run)
+    run.seek(0)
+
+    return run
+
+
+def _iter_run(run):
+    while True:
+        block = array.array(str('i'))
+        try:
+            block.fromfile(run, RUN_BLOCK * 6)
+        except EOFError:
+            pass
+
+        for i in range(0, len(block), 6):
+            yield tuple(block[i:i + 6])
+
+        if len(block) < RUN_BLOCK * 6:
+            break
+
+
+def _iter_merge_keys(index, records):
+    """
+    Yield ((latitude, longitude, speed, index, position), record) of sorted records, for heapq.merge without key
+    (python 2): keys are unique, so ties keep the order of runs and records are never compared
+    """
+
+    for position, sc in enumerate(records):
+        yield (sc[LATITUDE], sc[LONGITUDE], sc[SPEED], index, position), sc
+
+
+def igo2sygic_stream(files, igo_types, debug, max_rows, stats=None):
+    """
+    External memory version of igo2sygic: yield the same records, keeping at most max_rows parsed records in memory
+
+    Parsed records are spilled to sorted temporary runs, runs are merged by heapq.merge (stable, the same order
+    as sort of all records) and duplicates are eliminated on the merged stream
+
+    stats: Stats for parse stage (with sorted runs), merge and dedup are done while the stream is consumed
+    """
+
+    stats = stats or Stats()
+
+    runs = []
+    try:
+        with stats.stage('parse and sort runs') as stage:
+            count = 0
+            speedcams = Speedcams()
+            for filename in files:
+                for sc in iter_igo_file(filename, igo_types, debug, stats.rejects):
+                    speedcams.append(sc)
+                    if len(speedcams) >= max_rows:
+                        count += len(speedcams)
+                        runs.append(_write_run(speedcams))
+                        speedcams = Speedcams()
+
+            count += len(speedcams)
+            speedcams.sort()
+            stage['rows'] = count
+
+        print('\nSpeedCameras all: {:,} ({} runs on disk)'.format(count, len(runs)))
+
+        streams = [_iter_run(run) for run in runs] + [iter(speedcams)]
+        merged = (sc for key, sc in heapq.merge(*[_iter_merge_keys(index, stream) for index, stream in enumerate(streams)]))
+
+        count = 0
+        for sc in iter_unique(merged, debug):
+            count += 1
+            yield sc
+
+        print('\nSpeedCameras after cleaning: {:,}'.format(count))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def select_radar(duplicates):
+    """
+    Select speed camera to leave from duplicates sorted by speed
+    """
+
+    #group is sorted by speed, so the first nonzero speed is the lowest one
+    minspeed = next((radar[SPEED] for radar in duplicates if radar[SPEED] != 0), 0)
+
+    #from the exactly the same leave the last one
+    return next(radar for radar in reversed(duplicates) if radar[SPEED] == minspeed)
+
+
+def iter_unique(speedcams, debug=False):
+    """
+    Eliminate duplicates in one pass, speedcams have to be sorted by latitude, longitude, speed
+
+    Rules for speed cameras with the same location:
+    - if exactly the same: leave one
+    - one of speed is zero: leave others
+    - select lowest speed limit
+    """
+
+    for location, duplicates in itertools.groupby(speedcams, key=operator.itemgetter(0, 1)):
+        duplicates = list(duplicates)
+
+        if len(duplicates) == 1:
+            yield duplicates[0]
+            continue
+
+        keep = select_radar(duplicates)
+
+        if debug:
+            print('\n', '{},{}'.format(*location), 1)
+            for radar in duplicates:
+                print(radar, 0 if radar is keep else 1)
+
+        yield keep
+
+
+def eliminate_duplicates(speedcams, debug):
+    """
+    Columnar version of iter_unique: find groups with the same location on latitude, longitude columns, take records to leave
+    """
+
+    if not isinstance(speedcams, Speedcams):
+        speedcams = Speedcams(speedcams)
+
+    latitudes, longitudes = speedcams.columns[LATITUDE], speedcams.columns[LONGITUDE]
+
+    keep = array.array(str('i'))
+    start = 0
+    for end in range(1, len(speedcams) + 1):
+        if end < len(speedcams) and latitudes[end] == latitudes[start] and longitudes[end] == longitudes[start]:
+            continue
+
+        if end - start == 1:
+            keep.append(start)
+        else:
+            duplicates = [speedcams[i] for i in range(start, end)]
+            selected = select_radar(duplicates)
+            keep.append(start + next(i for i, radar in enumerate(duplicates) if radar is selected))
+
+            if debug:
+                print('\n', '{},{}'.format(latitudes[start], longitudes[start]), 1)
+                for radar in duplicates:
+                    print(radar, 0 if radar is selected else 1)
+
+        start = end
+
+    return speedcams.take(keep)
+
+
+def eliminate_duplicates_reference(speedcams, debug):
+    """
+    Reference (previous) implementation of eliminate_duplicates, kept to compare results
+
+    speedcams (list or Speedcams) are copied to lists, the input is not changed
+    """
+
+    speedcams = list(map(list, speedcams))
+
+    #eliminate duplicates:
+    #append duplicated speed cameras to radars dict group by location
+    radars = {}  #radars[location: latitude,longitude] = [[index, latitude, longitude, speed, kind, angle, both_ways, delete_marker: 0 - ok; 1 - del], [...], [...]]
+
+    INDEX = 0
+    SPEED = 3
+    MARK = 7
+
+    speedcams2 = speedcams[:]
+    index1 = len(speedcams2)
+    while speedcams2:
+        index1 -= 1
+
+        latitude1, longitude1, speed1, kind1, angle1, both_ways1 = speedcams2.pop()
+
+        location = str(latitude1) + ',' + str(longitude1)
+
+        if location in radars:
+            continue
+
+        index2 = index1
+        for speedcam2 in reversed(speedcams2):
+            index2 -= 1
+            latitude2, longitude2, speed2, kind2, angle2, both_ways2 = speedcam2
+
+            if latitude1 == latitude2 and longitude1 == longitude2:
+                delete_marker = 0
+                if location not in radars:
+                    radars[location] = [[index1, latitude1, longitude1, speed1, kind1, angle1, both_ways1, delete_marker]]
+                radars[location].append([index2, latitude2, longitude2, speed2, kind2, angle2, both_ways2, delete_marker])
+            else:
+                break
+
+    #if exactly the same: leave first, mark rest to delete
+    for duplicates in radars.values():
+        for idx1 in range(len(duplicates)):
+            for idx2, radar in enumerate(duplicates):
+                if idx2 > idx1 and radar[SPEED] == duplicates[idx1][SPEED]:
+                    radar[MARK] = 1
+
+    def count2leave(duplicates):
+        return sum(1 for radar in duplicates if radar[MARK] == 0)
+
+    #one of speed is zero
+    for duplicates in radars.values():
+        if count2leave(duplicates) > 1:
+            for radar in duplicates:
+                if radar[SPEED] == 0:
+                    radar[MARK] = 1
+
+    #select lowest speed limit
+    for duplicates in radars.values():
+        if count2leave(duplicates) > 1:
+            minspeed = min([radar[SPEED] for radar in duplicates if radar[MARK] == 0])
+            for radar in duplicates:
+                if radar[MARK] == 0 and radar[SPEED] != minspeed:
+                    radar[MARK] = 1
+
+    if debug:
+        for location, duplicates in radars.items():
+            print('\n', location, count2leave(duplicates))
+            for radar in duplicates:
+                print(radar)
+
+    #delete marked
+    del_list = [radar[INDEX] for duplicates in radars.values() for radar in duplicates if radar[MARK] == 1]
+    del_list.sort(key=int, reverse=True)
+    [speedcams.pop(d) for d in del_list]
+
+    return speedcams
+
+
+
+def merge_nearby(speedcams, radius, debug):
+    """
+    Merge speed cameras closer than radius (meters) to each other, speedcams have to be sorted by latitude, longitude, speed
+
+    Points are bucketed into a uniform grid with cell size >= radius, so each point is compared only
+    with points from its own and neighbouring cells. Each not yet merged point starts a cluster of all
+    not yet merged points within radius, from the cluster one speed camera is left by select_radar rules.
+    """
+
+    if radius <= 0 or not speedcams:
+        return speedcams
+
+    if not isinstance(speedcams, Speedcams):
+        speedcams = Speedcams(speedcams)
+
+    latitudes, longitudes, speeds = speedcams.columns[LATITUDE], speedcams.columns[LONGITUDE], speedcams.columns[SPEED]
+
+    #longitude cell is widened by the smallest cos(latitude) in data, so neighbouring cells are always enough
+    max_latitude = min(max(max(latitudes), -min(latitudes)) / 100000.0, 89.0)
+    cell_latitude = radius / METERS_PER_UNIT
+    cell_longitude = cell_latitude / math.cos(math.radians(max_latitude))
+
+    grid = {}
+    for index, (latitude, longitude) in enumerate(izip(latitudes, longitudes)):
+        grid.setdefault((int(latitude // cell_latitude), int(longitude // cell_longitude)), []).append(index)
+
+    radius2 = (radius / METERS_PER_UNIT) ** 2
+
+    merged = [False] * len(speedcams)
+    keep = []
+    for index, (latitude, longitude) in enumerate(izip(latitudes, longitudes)):
+        if merged[index]:
+            continue
+
+        cos_latitude = math.cos(math.radians(latitude / 100000.0))
+        row, col = int(latitude // cell_latitude), int(longitude // cell_longitude)
+
+        cluster = []
+        for cell in ((r, c) for r in (row - 1, row, row + 1) for c in (col - 1, col, col + 1)):
+            for index2 in grid.get(cell, ()):
+                if merged[index2]:
+                    continue
+                if (latitudes[index2] - latitude) ** 2 + ((longitudes[index2] - longitude) * cos_latitude) ** 2 <= radius2:
+                    merged[index2] = True
+                    cluster.append(index2)
+
+        if len(cluster) == 1:
+            keep.append(index)
+            continue
+
+        #the same order as duplicates in iter_unique: by speed, then by location
+        cluster.sort(key=lambda i: (speeds[i], i))
+        duplicates = [speedcams[i] for i in cluster]
+        selected = select_radar(duplicates)
+        keep.append(next(i for i, radar in izip(cluster, duplicates) if radar is selected))
+
+        if debug:
+            print('\n', 'merged', len(cluster))
+            for radar in duplicates:
+                print(radar, 0 if radar is selected else 1)
+
+    keep.sort()
+
+    return speedcams.take(keep)
+
+
+def _attach_rtree(conn, dat_filename, create):
+    """
+    Attach R*Tree side index (file dat_filename.rtree) of OfflineSpeedcam rowid by location, return True if attached
+
+    Index is kept out of dat file, so dat file stays the same for Sygic
+    """
+
+    rtree_filename = dat_filename + '.rtree'
+    if not create and not os.path.exists(rtree_filename):
+        return False
+
+    is_new = not os.path.exists(rtree_filename)
+
+    conn.execute('ATTACH DATABASE ? AS rtree', (rtree_filename,))
+    conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS rtree.SpeedcamIndex USING rtree_i32(Id, MinLatitude, MaxLatitude, MinLongitude, MaxLongitude)')
+
+    if is_new:
+        conn.execute('INSERT INTO rtree.SpeedcamIndex (Id, MinLatitude, MaxLatitude, MinLongitude, MaxLongitude) SELECT rowid, Latitude, Latitude, Longitude, Longitude FROM OfflineSpeedcam')
+
+    return True
+
+
+def dat2points(dat_filename, bbox=None, around=None):
+    """
+    Yield speedcams from dat file
+
+    bbox: (min latitude, min longitude, max latitude, max longitude) in degrees
+    around: (latitude, longitude, radius in meters)
+
+    Filtered query uses R*Tree side index when it exists (unordered), speedcamsLatLon index otherwise
+    """
+
+    if not os.path.exists(dat_filename):
+        return
+
+    if around:
+        latitude, longitude, radius = around
+        delta = radius / METERS_PER_UNIT / 100000.0
+        cos_latitude = max(math.cos(math.radians(latitude)), 0.01)
+        bbox = (latitude - delta, longitude - delta / cos_latitude, latitude + delta, longitude + delta / cos_latitude)
+
+    conn = sqlite3.connect(dat_filename, isolation_level=None)
+
+    cursor = conn.cursor()
+
+    columns = 'o.Latitude, o.Longitude, coalesce(o.SpeedLimit, 0), o.Type, coalesce(o.Angle, 0), coalesce(o.BothWays, 1)'
+
+    if bbox is None:
+        cursor.execute('SELECT ' + columns + ' FROM OfflineSpeedcam o ORDER BY o.Latitude, o.Longitude')
+    else:
+        bbox = [int(round(value * 100000)) for value in bbox]
+
+        if _attach_rtree(conn, dat_filename, False):
+            cursor.execute('SELECT ' + columns + ' FROM rtree.SpeedcamIndex r JOIN OfflineSpeedcam o ON o.rowid = r.Id WHERE r.MinLatitude >= ? AND r.MaxLatitude <= ? AND r.MinLongitude >= ? AND r.MaxLongitude <= ?', (bbox[0], bbox[2], bbox[1], bbox[3]))
+        else:
+            cursor.execute('SELECT ' + columns + ' FROM OfflineSpeedcam o WHERE o.Latitude BETWEEN ? AND ? AND o.Longitude BETWEEN ? AND ? ORDER BY o.Latitude, o.Longitude', (bbox[0], bbox[2], bbox[1], bbox[3]))
+
+    try:
+        if around:
+            latitude, longitude = latitude * 100000, longitude * 100000
+            cos_latitude = math.cos(math.radians(latitude / 100000.0))
+            radius2 = (radius / METERS_PER_UNIT) ** 2
+            for sc in cursor:
+                if (sc[LATITUDE] - latitude) ** 2 + ((sc[LONGITUDE] - longitude) * cos_latitude) ** 2 <= radius2:
+                    yield sc
+        else:
+            for sc in cursor:
+                yield sc
+    finally:
+        conn.close()
+
+
+def _tile_xy(latitude, longitude, zoom):
+    """
+    Web mercator tile of sygic coordinates at zoom
+    """
+
+    count = 1 << zoom
+    latitude = math.radians(max(min(latitude / 100000.0, 85.05112878), -85.05112878))
+
+    x = int((longitude / 100000.0 + 180.0) / 360.0 * count)
+    y = int((1.0 - math.log(math.tan(latitude) + 1.0 / math.cos(latitude)) / math.pi) / 2.0 * count)
+
+    return min(max(x, 0), count - 1), min(max(y, 0), count - 1)
+
+
+def _spread_bits(value):
+    """
+    Spread 16 bits of value to even bits, for z-order (morton) code
+    """
+
+    value = (value | (value << 8)) & 0x00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F
+    value = (value | (value << 2)) & 0x33333333
+    return (value | (value << 1)) & 0x55555555
+
+
+def _compact_bits(value):
+    value &= 0x55555555
+    value = (value | (value >> 1)) & 0x33333333
+    value = (value | (value >> 2)) & 0x0F0F0F0F
+    value = (value | (value >> 4)) & 0x00FF00FF
+    return (value | (value >> 8)) & 0x0000FFFF
+
+
+def _int64_column():
+    return array.array(INT64_TYPECODE) if INT64_TYPECODE else []
+
+
+def _write_map_zoom(html_file, zoom, tiles):
+    """
+    Write <script type="application/json" id="tiles-ZOOM"> block: {"x,y": [[latitude, longitude, speed or count, type], ...]}
+    """
+
+    html_file.write('<script type="application/json" id="tiles-{}">{{'.format(zoom))
+    for number, (tile, points) in enumerate(tiles):
+        html_file.write('{}"{},{}":['.format(',' if number else '', _compact_bits(tile), _compact_bits(tile >> 1)))
+        html_file.write(','.join('[{},{},{},{}]'.format(*point) for point in points))
+        html_file.write(']')
+    html_file.write('}</script>\n')
+
+
+def _iter_map_clusters(records, clusters):
+    """
+    Group records (cell z-order code, type, count, latitude sum, longitude sum), sorted by cell code, into clusters by cell
+    and type, yield (tile, clusters); clusters of this zoom are appended to arrays in clusters for the next zoom
+    """
+
+    for tile, group in itertools.groupby(records, key=lambda record: record[0] >> (2 * MAP_CLUSTER_SHIFT)):
+        cells = {}
+        for code, kind, count, latitude, longitude in group:
+            cell = cells.get((code, kind))
+            if cell is None:
+                cells[(code, kind)] = [count, latitude, longitude]
+            else:
+                cell[0] += count
+                cell[1] += latitude
+                cell[2] += longitude
+
+        points = []
+        for (code, kind), (count, latitude, longitude) in sorted(cells.items()):
+            for column, value in zip(clusters, (code, kind, count, latitude, longitude)):
+                column.append(value)
+            points.append((latitude // count, longitude // count, count, kind))
+
+        yield tile, points
+
+
+def _write_map_tiles(html_file, speedcams):
+    """
+    Write tiles of zoom levels, return (count of speedcams by type, written zoom levels)
+
+    Points are sorted by z-order code of cells (MAP_CLUSTER_SHIFT zoom levels finer than tiles), so each tile
+    of any zoom is a contiguous run; clusters of a zoom are computed from clusters of the finer one.
+    Cluster levels which do not merge enough points (MAP_CLUSTER_RATIO) are not written, spread out points
+    would be there almost once per level.
+    """
+
+    if not isinstance(speedcams, Speedcams):
+        speedcams = Speedcams(speedcams)
+
+    latitudes, longitudes, speeds, kinds = speedcams.columns[LATITUDE], speedcams.columns[LONGITUDE], speedcams.columns[SPEED], speedcams.columns[KIND]
+
+    cell_zoom = MAP_DETAIL_ZOOM + MAP_CLUSTER_SHIFT - 1
+
+    codes = _int64_column()
+    types = {}
+    for latitude, longitude, kind in izip(latitudes, longitudes, kinds):
+        x, y = _tile_xy(latitude, longitude, cell_zoom)
+        codes.append(_spread_bits(x) | (_spread_bits(y) << 1))
+        types[kind] = types.get(kind, 0) + 1
+
+    if numpy is not None:
+        order = array.array(str('i'), numpy.argsort(numpy.asarray(codes, dtype=numpy.int64), kind='stable').astype(numpy.intc).tobytes()) if codes else array.array(str('i'))
+    else:
+        order = sorted(range(len(codes)), key=codes.__getitem__)
+
+    #single points, detail tile is one zoom level coarser than cell
+    _write_map_zoom(html_file, MAP_DETAIL_ZOOM, (
+        (tile, [(latitudes[i], longitudes[i], speeds[i], kinds[i]) for i in indexes])
+        for tile, indexes in itertools.groupby(order, key=lambda i: codes[i] >> 2)))
+
+    #clusters
+    zooms = [MAP_DETAIL_ZOOM]
+    written_count = len(codes)
+    records = ((codes[i], kinds[i], 1, latitudes[i], longitudes[i]) for i in order)
+    for zoom in range(MAP_DETAIL_ZOOM - 1, -1, -1):
+        clusters = (_int64_column(), array.array(str('i')), _int64_column(), _int64_column(), _int64_column())
+        tiles = list(_iter_map_clusters(records, clusters))
+
+        if len(clusters[0]) <= written_count * MAP_CLUSTER_RATIO:
+            _write_map_zoom(html_file, zoom, tiles)
+            zooms.append(zoom)
+            written_count = len(clusters[0])
+
+        #cells of the next zoom are 2x2 cells of this one
+        records = ((code >> 2, kind, count, latitude, longitude) for code, kind, count, latitude, longitude in izip(*clusters))
+
+    return types, zooms
+
+
+def points2map(speedcams):
+    """
+    Write Google Maps page with speedcams, streamed straight to the file
+
+    Points are precomputed into tiles (web mercator, 256 px): clusters grouped by type for zoom levels below
+    MAP_DETAIL_ZOOM, single points for MAP_DETAIL_ZOOM and above. Each written zoom level is a JSON block parsed by
+    the page only when used (zoom levels which are not written use the next finer one), markers are created only
+    for visible tiles.
+    """
+
+    html_filename = 'offlinespeedcams.dat_' + datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    with open(html_filename + '.html', 'w') as html_file:
+        html = []
+        html.append('<!DOCTYPE html>')
+        html.append('<html>')
+        html.append('<head>')
+        html.append('    <title>' + html_filename + '</title>')
+        html.append('    <meta charset="utf-8">')
+        html.append('    <style>')
+        html.append('        #map {')
+        html.append('            height: 100%;')
+        html.append('        }')
+        html.append('')
+        html.append('        html, body {')
+        html.append('            height: 100%;')
+        html.append('            margin: 0;')
+        html.append('            padding: 0;')
+        html.append('        }')
+        html.append('    </style>')
+        html.append('</head>')
+        html.append('<body>')
+        html.append('<div id="map"></div>')
+
+        html_file.write('\n'.join(html) + '\n')
+
+        types, zooms = _write_map_tiles(html_file, speedcams)
+
+        html = []
+        html.append('<script>')
+        html.append('')
+        html.append('    var sygicTypes = {')
+        html.append('        0: {name: "RADAR_SYMBOL", symbol: "UE37A"},')
+        html.append('        1: {name: "RADAR_STATIC_SPEED", symbol: "UE37B"},')
+        html.append('        2: {name: "RADAR_STATIC_RED_LIGHT", symbol: "UE37E"},')
+        html.append('        3: {name: "RADAR_SEMIMOBILE_SPEED", symbol: "UE37B"},')
+        html.append('        4: {name: "RADAR_STATIC_AVERAGE_SPEED", symbol: "UE37C"},')
+        html.append('        5: {name: "RADAR_MOBILE_SPEED", symbol: "UE37B"},')
+        html.append('        6: {name: "RADAR_STATIC_RED_LIGHT_SPEED", symbol: "UE37E"},')
+        html.append('        7: {name: "RADAR_MOBILE_RED_LIGHT", symbol: "UE37E"},')
+        html.append('        8: {name: "RADAR_MOBILE_AVERAGE_SPEED", symbol: "UE37C"},')
+        html.append('        9: {name: "RADAR_FAV_COPS_PLACE", symbol: "UE37D"},')
+        html.append('        10: {name: "RADAR_INFO_CAMERA", symbol: "UE37A"},')
+        html.append('        11: {name: "RADAR_DANGEROUS_PLACE", symbol: "UE37A"},')
+        html.append('        12: {name: "RADAR_CONGESTION", symbol: "UE37F"},')
+        html.append('        13: {name: "RADAR_WEIGHT_CHECK", symbol: "UE37A"},')
+        html.append('        14: {name: "RADAR_DISTANCE_CHECK", symbol: "UE37A"},')
+        html.append('        15: {name: "RADAR_CLOSURE", symbol: "UE030"},')
+        html.append('        16: {name: "RADAR_SCHOOLZONE", symbol: "UE02E"}')
+        html.append('    };')
+        html.append('')
+        html.append('')
+        html.append(
+            '    var UE37A = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAACc0lEQVRo3u1Z0XXCMAyUuwErZAVWYAVWYIV0BBghHSGMACOwQjoCjHD9wPQ58jmxHYLTV+49fkC2JVk6SUbkjTeWBwBbAC36qAGsSusWo3yDMK4ANqV1zFXexbq0rkz5HVG0CxjVLSqcAKxseLhonN8rq3QvJ0rr7RpQK+UuRGZNbqIqrfvDuxqbgOxeybWl9RdCl+2ALAu1cqwEYJMaFiTZu5IGXHISk6zblVDe82QsNZKbu76UVm0sd1O8SOrD/pUGjNJmxB4VSej5aTWGNkmM02Qljji9wgB99Q2RaYkBp8B+OhTno9VA8lVEjvU/bWDP7dhNDeEj0QZNkwdjzDeRY9/d2IbGmKOInJ2vqlg6TgISChCJbQwpRfIqmlajbsBu5nl/YMlNEmBv0d1vJSLPo9VUtgBvMXYja1ifNH3wCfD1emQNa51H2YWE6XRajaHNgDeRYrSzVteQ7RTltSejk4sYEFVlyZn53SqAUyyTkLW9ApV4bpN7rrvJpL5dhcI1ca1OaFowkzyYGovq9pLDAD7zjebe0OJkNsC9RajtJ2tgIU4cJwJwPi7yegC/now7Ek8aNOzhjzzI7m3gd7a7IeFs2lT7sJkhN4z0Xr3RVfdC2tsHY0xSX2PBQi6rLbB90qfa23cGibfsAhLIo+yKCn8G9yODxNqkycg65GQPm/xsAr8u1VrA9VjykD434PdXrYjNAUuT7pWccw6ZEzYX3Ulv/WuA+API4v6AsE52yeGmBbz3/RwKnUn5mlTlhgn9JWxE+nXgS/hrwhJxMMb4eYp71btMdc3M6BVbE4o5uSdy/jj3XDyi4xh4h3rjjX+LH/cFw6xmLw4KAAAAAElFTkSuQmCC";')
+        html.append(
+            '    var UE37B = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAACXklEQVRo3u2Y23niMBSEZ/ZLA26BFtgSSAlJCaQEXIIpAUqAEuwScAlQAi5h9sGSI/T5im3sZP2/cJPFGV3OGQlYmCmS1pJ2ku6alpOkbVWcrAh+AyCeehA9EpLvjQIkBQCuAAIAKYDzxIGvANgZCEnua1ubZSNJVyNmcpyYLv5vbzXPJSQz08EKwMeL485IHs371Lyuuwiw6gMAF+RL6qVIgiOilD8t+gmmCN7571raCJg1P15A4x7oQeh9/kDJJpybgBTAnmRZ7dibhBDhO6/3ZsgltCf5tyJ4AADJjOQXgHcA2ZwEhCTDto1JJkOJGELA2S/vkraSYseQ3U01LdIiyRTA1xwEPIy8pBjAAcDG+dqu/aukYiOb5ZZMKeBM8uYEf/IC9wkAxMaaWGor7dgCrEeB8ext/FKAfIYsvWagLI3aLNKm49R5v2nRvmgrKTBZKZN0Q26bSyGZSApRsunfShrfANR77nK6Fql1y0GycZXGNBcr8bRZ7CvAHfW047MpUNj1yQS4677LZiwOSxjQVpQiadVwa7Bx2sZq5u6mUXN0rWI39gwAwMGpsJ+oX0oZgE9bOyRFqMk+r5oBmerrPrOTdPHaRK6VMHajicYZGEqATMCtUqmkgy/OfL/W40XaSwVYDnL2hdNPoIqbPq9d1EXAGCeyLYCtF1fjIDmeqlNKHfNI2YVY0hGPt3CDCRjk5NTACrnd7gzbNFLuNCOMcz9Ud5I7OgVv4ffhpbxnufeJoa+V6HUcHLCP5zHV8/TEyF8HqbQjCvMZxTbP5US2CPixLAKmZhGw8L/zD2iHYmmrdwfBAAAAAElFTkSuQmCC";')
+        html.append(
+            '    var UE37C = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAACpElEQVRo3u1Z7ZHiMAyVbq4BKIErgRZyJbAlpAWuBLYEKAFKCCWwJSQlQAlvfyCBosuHw9ohd8ubYZixZVlPkWXZJnrhHwCADECB8bAFsIhl/EKUngDMRnDWEsAZQBlL4UoI5KmNN3NuZM7er/AjQF/N6/J5U2Ej01xCyYYQ8MgSOn85dMAjBCaFFAQuRPSHiOYsIKJf0jZ5AgdmnjPzOzPf4piZK2Z+J6I5ER2nSmDHzG9dAsx8YebfMUnEIlCRCREAOYDSZJcCgF38bzQg04xBYKchA2BLRFsisjk8I6JC9xKR3U2JwFGMz4moa8OzJUKUMAohcKTr5/5oE2Bm7QvZI1byX3XIVDJfb5j97BNg5oqu2SMEIRtRb3nAzAciOoRMGCWEAKjhHwHi6vko1WasNaChE+K1gxszLlx6VJRaavcUe7nIzKRk9iieRQCSPlWmcx8AsG/R8VQCNRId4/cd459OQMNp7cbMAKxd2JS4nvZmRuckCIRib3TquhlMoHcfSIiVLOoL3Te39MD9vJoCm69b+B3x4LrozVghiFqNDkRI2TEOJBWeHslAkwXqV5FRwqUJr2uVZyPlRnag++KuvqLohf8KLl3aGj+TtnPDmLX0laZtYdotboejFMYvu3ZTQ27l2jWlro0eLa1zpz/dUdN4bCMGnK23TL89nc0M4UUTodFgap4F7jW892AtjAypUwOh5E9W1vjMGaJPT4WTq4VRQ/ioHpgxNQyxa8hGdotrMUbvdTLnSb02WUnIaExHuQt9GGi+BoH1rsjpq+bZhE/R0O+zmG2PG1omXNQo/ek6ODl5DSMNn7ylv4Tc6jkCcd6IzYR6FeLTpl2QS9Pu87t/6fTp2CMegbZP3uDNTcuYfYveJf6+IyqF/HjZ6YXvjk9KkDD5QQnRFAAAAABJRU5ErkJggg==";')
+        html.append(
+            '    var UE37D = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAADIUlEQVRo3uVZ23XiMBC9k5MGSAluwSnBW4JTAlsClMCWQEqAEkwJUIIpwZRw84FsxrL8kmxDzt6fBCTNW6OZAfifQXJN8kByE0gnJ7khGS+tQME7DgE0Ij6wG3v+LVCHk/mbBNDQVr9MroCxUJuAJcNVgPv1uZNrA8nU2zwmxkly7yKs3L8OpH92rMUkz2Z9vJctAWliPlXrK/N97mslc3kb94jk3uKd+3ogVZe1xIFkVCrhRbjJZ6X45Q5+/nyMpQ/aGlMJ3mIwp8enIl54xeM4Pvtgq/96GGsnPXs2nAb5EK8afsO8otIXjUs31vquQ6A+xbOWc7G1LzZCa1n674RKjzb2ak/OdvgqsLNkKBx7aum26yX+ArAFcFPfHdX/N8wIEbmh/jKfjDz/RhMz1rBDKJ4o/ls9RzKh5ws/VKldmLwVps33AwQ/BArswpkefYWMFD4CkAGI1NcXPO7GVUSOA+jEeJTgEQAdJlcAXyIyurQeooBOZ5lRaCraMR+ZrZiSdslAP1reHVgPj5VS4hxO8UFYt32zFXKGV6J4BfXamqiuzWct5Bz8wkKJ9Rcxm1t4wzOo0beJ6dhfJlejVm4UQSGrcn6xlPCG7zrYcKwXdXsvIv4K6NBtDaM361CtkQaghb4uqYAp5sqCMWW9gq26wtpLbIRuww3AVkS+rTMp6i9zivqsx4VvyyBHEbladHcAutLoUUS+RB2IAPiNLp6Di4h86hDSLvsNaK+52N1tPRu1Cy0O4WMA09Uh0+MmIh/lB1dLaZcKVwCfIiIA/mCZbHQE8GF4/rXWugfJbDYrkbU+RyupkTtkssc36y4FdPyfB+wJmtSxOUDeOPbYRqvugSuExlZ/FxE5jTxTwdHBDal73HvongfZw6bEWg/qnhweGBJCWRfBRkyWShjhl0ixGR/j9rVjveoI3x063CwXRQDO7KwyJkcCoOjgWWVC1x3onSq8ACoZXQrY48RXw1aPXBoKWGXsyyP0d+Kn4z2cRDD0ZC/GvZ8IA5s/cdrYc4bZEO/TiL65a/+rz/uDVrZwmXlIZp8HOeRY80lTkcXwA9Aco7XKju/lAAAAAElFTkSuQmCC";')
+        html.append(
+            '    var UE37E = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAACQElEQVRo3u2a4XHiQAyFP91cA1wJbsFXApRgSvCVQEpISoASoARcAikhlBBKePeD9cDl7DXBWrOZyZvJ8EO7jN5Kq30SgW98YUgqJe01Ds+Pcr6Q9D7S+RaHe/34MYJDDcyczqOUVE9NoIzYdsDCrgA8AafInsLpMG5DJPdXkT0zSYeefet7/BgTgS68mNlLn9HMTsCSeCQeS2BogZkdgU2OBF7DCd+0NkcCn0mLLFPoMyXVq/y6Eigl3epYeeO6SQkArIYWSCo4P4J5Eoi9qCFCWzJNoRZrSVtJ/6RJIHbAMX0AfiYgAFABlaREX39BighMilQRgLN4u8Y8/LkiRQQa4FfQRO2DtTOzBWcdlAd61Ogh2KoO2z6o0S7b3WrUm8A84uA1wb0XAW8x1xB/zEpJFZmq0Tbfh+p8QaZi7iORSeAq5sJnM7DulUzF3CzIhVjzvgn3JFsx1w6pFvwfiScz+xMGWdNOILoQmUq8h0rTtWcdKbF3ldEUUmIGbCWduDT5rj1AagLXRJLPPVOr0R3DE7nHQPGpdN2xvgiNjusd8I7ACfgNNB8u7BtQmtkSRxkxCj0RqMNJv8Ui02N/eAROZrbhLOb66vxa56lElmKuHRdWA+sqMh0ttnAbmUxNoHV86HSPniS9R4sF8RH70cx2DKdZeijeE6+6bKFCufbE3lKilLQ1s6WkDRf9czSznaQ54Nq8p7jEVXi4aqAJ45UinPCe/vyfVm5IepYvkqjVGIEsfugeS+Lr/qvBN5zwF1uu96Vz+2R8AAAAAElFTkSuQmCC";')
+        html.append(
+            '    var UE37F = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAACh0lEQVRo3u1Y23GjQBDsuXICXAikwIWAQ5BDIAU5BCkEOwQRghSCFIIIQQ6h/cEsN2Bgd0ESdXV0lUrFY96zO70AK1asWLHif4b4XiC5AZDqrxh4rQLwCQAisl86KOv8B2t8aCBD721J7vTdK8lkad+dUxxzvEcmU5nD0s6nLvMzAs+WDGCyEyST2Mo9IoAryfMM+aetgRdj1O02lf6/T1UqIl/PCqAByRvbWK4FItDMAZLsPLsAKM11BqAvqC8AewAnEbksFgnJDach7+ixMyEWB5WPX0PG6EGvM9NWaYB8qov/Xsj9XptFjHrhAsAJAETkQvICIEfdJmPOJwCORkdDLQCUIlKNyOao2xNqyzl+JPknuC1JnjXyY08FesvdUz2S3EaXf7iS1xjB2PKnxqDDbo7zxpfM6AxLCP9O3xBsjZwjfOHZCvMnTi/J3OP0mZ3dgTVtcG1WBBkKD8BWdnAm/fLoqVBP5HcAbz0TNgeQoF7kJe4IXfhOp5+TaTbPnawXPe8VLiNm8Uaz1hCoLVf9rflNY7ocHnazdp4Re9mAvYZovkTqHIq8YM1EStQtZYfQ2FHUydi9vhKRUpMyNMyateg9E3cy4obOBiF9eX843lWJSBkdgAnkZrPwZLSms28X6nM+W9B5oNNW0QF0FFSaEQHwijZnOkkEALx17Oz1/m8oP1PMa10zIX/sPmxzougDkZG9de4n5llrMk+pwDPaZ4z9eqm9L0sHmw03VJSKWPYa9W3IDC2Hnd5PSB7tg7kBxJC+R6D1tWRKC5WeEj8ara8l0QEoyVoygNbpbkoF/n3wJ2u1mE0xOHyUvc3V7QwMnZfvwkp7djTqddCXihUrVqxYEYxvjk3SBt4cZTYAAAAASUVORK5CYII=";')
+        html.append(
+            '    var UE02E = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAAC7klEQVRo3u1Y3XnrIAyFbuAVvIJX8ApZIXcE3xHcEdIR3BGSEbyCM4I7wrkPhUYoAoTJT+/3RS+JAQkdJMQBY17ykpf812JrDQBojTE79/lhrf16Niit4x2AFaGsALpn+6YFcIQsh2f7pgWwRgAsj/TjrUK3KWz/dQDOhe2/DsBnpP39kQCqBMBQU4FcJRsADM8CsCcA5gK9BsDMNr9a/xaOdwAOUgVyK9pk9AfIstP6UON8bHK1MwkbY6k/RZvY0QZtvk6J3I5VqvuW4Eja5GQU7DQPTyEA7QbnvRwEeyMbs9579acKAJDSie2F4vwvcb4vXXHI6dYyu5QQrgD29wJw1HhNZCbAab3vFRGdOdBa5/lKxlhodLWJTq+M6KIF8ZZwvHUrScP61+hLHa0oX4k+SVrzXYazc4kA8F3OZmMM5TbvzrBWqO6Z/WrKZWeMKb8csZRZ8V0pWmwro42z6fO9AbArtKEneszJPgGsaHKv6/6PCr0R4V7TH3BugwWEDOVl1Mvq9L0zA/m/pICzObczVcivD0VRiOinSOGBRX37KY1r3l4cBVwuLhNpaxI6RyHy24ketuV/sNoRu1HQZIyPXt3h5lZxyboayoJEFcno+grmN33dtVMI+ZKIzIxM5cikEHA5tTvStp0rIbz//kwgTAIoXucEHS57MraPRaDkRhbkoLX2RD7PJqQLmteJnn3/ic1nrT1Za8XnmhIAtAoE3Ma9SNN3og7sIBSEgvy01n4YY06R/npBSKlnoZ9TjTFhi+d/69p5mt7uvQhhBRojY+imPiZsUT40MWD00Ftxq7uBtGLCmE4JgPIhzrk4bZlMrTCjh8zYWQHghw8p5gNqXytI/q/Iv7qNKQAsSql9QvfDkptX45BqJXAhaWukn96Fu4ytSQNWWqEB1ywym4su9Fc83m3OgRWCLMNkRUFXkRBnn0tGT6LHU64vY9MD1lMIXEiUj4JPoTWhE7vwSOeFt9sr7eUOxJe8pEb+ARnn4rUoLVH1AAAAAElFTkSuQmCC";')
+        html.append('    var UE030 = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAAB1UlEQVRo3u1Z25HCMAyUmWsgLdACLdBCWqCFtJAWaAFKgBKOEqCEUMLex5kZjyPbimPH8V32iwxE3pXWyA+iDRtmQaUIAmBPRK1+7B0/uxLRg4heSqlraeEf4h2AJ+LQAziUJJ4KF13BRYgfZ2Q8hK6mrLtwA9DkIH8WDN5rkXtHjA6yOfNMaqkA+W8Ap4iYh0DcNCI8thliiDuE3DzJibcTgHYpn3oSdYkN2Di8ek5JXJiw6ZV2+DMuG/NFDJMqDmDP+TE3eWN8zk7yHuHI/qItX0/g6VXQ3rfRC8ZMLYBzQbgKTPmm+S+tCNsJYRvjd2FVNPsGlwNThSb00lDS+wwfey6M/lJ3pmIiMhW+lVKPkgKI6G49j5YXO8+XdyoPO4EjR/gEvLiIyAeu49ocvBWw8S6XeDmHnSTKmvGnBRRpYAEOI0t9GZ/tCcP2AKVUkrMkIexJOxJgVkAkYGHYHPx9ienEx5LsmU7chl6w10LZdmAC8lFroVPtq9GGsVGJ/QCXfdmuDDXvyPTLde+JdZCeCVLHqYQOVPe5UCDg+k/mBIHXfzZqDFLv6bRQxAef+4HGEaPM/YBFIDfy3NAYIuq9I8tYjeVuKR1Cit4T/++b+g0J8AM1HTteeD/mQgAAAABJRU5ErkJggg==";')
+        html.append('')
+        html.append('    var map;')
+        html.append('    var detailZoom = ' + str(MAP_DETAIL_ZOOM) + ';')
+        html.append('    var zooms = ' + json.dumps(zooms) + ';')
+        html.append('    var types = ' + json.dumps(dict((str(kind), count) for kind, count in types.items()), sort_keys=True) + ';')
+        html.append('    var tiles = {};')
+        html.append('    var shown = {};')
+        html.append('    var visibleTypes = {};')
+        html.append('')
+        html.append('    function tilesAt(zoom) {')
+        html.append('        if (!(zoom in tiles)) {')
+        html.append('            var data = document.getElementById("tiles-" + zoom);')
+        html.append('            tiles[zoom] = data ? JSON.parse(data.textContent) : {};')
+        html.append('        }')
+        html.append('        return tiles[zoom];')
+        html.append('    }')
+        html.append('')
+        html.append('    function tileX(lng, zoom) {')
+        html.append('        return Math.floor((lng + 180) / 360 * Math.pow(2, zoom));')
+        html.append('    }')
+        html.append('')
+        html.append('    function tileY(lat, zoom) {')
+        html.append('        lat = Math.max(Math.min(lat, 85.05112878), -85.05112878) * Math.PI / 180;')
+        html.append('        return Math.max(Math.min(Math.floor((1 - Math.log(Math.tan(lat) + 1 / Math.cos(lat)) / Math.PI) / 2 * Math.pow(2, zoom)), Math.pow(2, zoom) - 1), 0);')
+        html.append('    }')
+        html.append('')
+        html.append('    function tileMarkers(zoom, points) {')
+        html.append('        return points.map(function (point) {')
+        html.append('            var name = (point[3] in sygicTypes) ? sygicTypes[point[3]].name : point[3];')
+        html.append('            var cluster = zoom < detailZoom;')
+        html.append('            return new google.maps.Marker({')
+        html.append('                map: visibleTypes[point[3]] ? map : null,')
+        html.append('                position: new google.maps.LatLng(point[0] / 100000, point[1] / 100000),')
+        html.append('                title: cluster ? "COUNT: " + point[2] + "; TYPE: " + name + ";" : "SPEED: " + point[2] + "; TYPE: " + name + ";",')
+        html.append('                label: cluster && point[2] > 1 ? String(point[2]) : null,')
+        html.append('                type: point[3]')
+        html.append('            });')
+        html.append('        });')
+        html.append('    }')
+        html.append('')
+        html.append('    function showTiles() {')
+        html.append('        var bounds = map.getBounds();')
+        html.append('        if (!bounds) {')
+        html.append('            return;')
+        html.append('        }')
+        html.append('')
+        html.append('        var zoom = Math.min(map.getZoom(), detailZoom);')
+        html.append('        while (zooms.indexOf(zoom) < 0) {')
+        html.append('            zoom++;')
+        html.append('        }')
+        html.append('        var count = Math.pow(2, zoom);')
+        html.append('        var data = tilesAt(zoom);')
+        html.append('        var x1 = tileX(bounds.getSouthWest().lng(), zoom), x2 = tileX(bounds.getNorthEast().lng(), zoom);')
+        html.append('        var y1 = tileY(bounds.getNorthEast().lat(), zoom), y2 = tileY(bounds.getSouthWest().lat(), zoom);')
+        html.append('        if (x2 < x1) {')
+        html.append('            x2 += count;')
+        html.append('        }')
+        html.append('        x2 = Math.min(x2, x1 + count - 1);')
+        html.append('')
+        html.append('        var visible = {};')
+        html.append('        for (var x = x1; x <= x2; x++) {')
+        html.append('            for (var y = y1; y <= y2; y++) {')
+        html.append('                var tile = ((x % count) + count) % count + "," + y;')
+        html.append('                var key = zoom + "/" + tile;')
+        html.append('                visible[key] = true;')
+        html.append('                if (!(key in shown) && (tile in data)) {')
+        html.append('                    shown[key] = tileMarkers(zoom, data[tile]);')
+        html.append('                }')
+        html.append('            }')
+        html.append('        }')
+        html.append('')
+        html.append('        for (var key in shown) {')
+        html.append('            if (!(key in visible)) {')
+        html.append('                shown[key].forEach(function (marker) {')
+        html.append('                    marker.setMap(null);')
+        html.append('                });')
+        html.append('                delete shown[key];')
+        html.append('            }')
+        html.append('        }')
+        html.append('    }')
+        html.append('')
+        html.append('    function markersShowHide(type, visible) {')
+        html.append('        visibleTypes[type] = visible;')
+        html.append('        for (var key in shown) {')
+        html.append('            shown[key].forEach(function (marker) {')
+        html.append('                if (marker.type == type) {')
+        html.append('                    marker.setMap(visible ? map : null);')
+        html.append('                }')
+        html.append('            });')
+        html.append('        }')
+        html.append('    }')
+        html.append('')
+        html.append('    function initMap() {')
+        html.append('        map = new google.maps.Map(document.getElementById("map"), {')
+        html.append('            zoom: 5,')
+        html.append('            center: new google.maps.LatLng(48.208775, 16.372477)')
+        html.append('        });')
+        html.append('')
+        html.append('        map.addListener("idle", showTiles);')
+        html.append('')
+        html.append('        var controlUI = document.createElement("div");')
+        html.append('        controlUI.style.backgroundColor = "#fff";')
+        html.append('        controlUI.style.border = "2px solid #fff";')
+        html.append('        controlUI.style.borderRadius = "3px";')
+        html.append('        controlUI.style.boxShadow = "0 2px 6px rgba(0,0,0,.3)";')
+        html.append('        controlUI.style.lineHeight = "35px";')
+        html.append('        controlUI.style.marginLeft = "10px";')
+        html.append('        controlUI.style.textAlign = "left";')
+        html.append('        controlUI.title = "Filter markers";')
+        html.append('')
+        html.append('        var centerControlDiv = document.createElement("div");')
+        html.append('        centerControlDiv.index = 1;')
+        html.append('        centerControlDiv.appendChild(controlUI);')
+        html.append('')
+        html.append('        for (var type in types) {')
+        html.append('            var controlCheckBox = document.createElement("input");')
+        html.append('            controlCheckBox.value = type;')
+        html.append('            controlCheckBox.type = "checkbox";')
+        html.append('            controlCheckBox.checked = false;')
+        html.append('            controlCheckBox.style.margin = "0px 5px 0px 5px";')
+        html.append('            controlCheckBox.style.verticalAlign = "middle";')
+        html.append('')
+        html.append('            controlCheckBox.addEventListener("click", function () {')
+        html.append('                markersShowHide(this.value, this.checked);')
+        html.append('            });')
+        html.append('')
+        html.append('            var controlImage = document.createElement("img");')
+        html.append('            controlImage.src = (type in sygicTypes) ? eval(sygicTypes[type].symbol) : UE37A;')
+        html.append('            controlImage.width = "24";')
+        html.append('            controlImage.height = "24";')
+        html.append('            controlImage.style.backgroundColor = "rgba(0,0,0,0.7)";')
+        html.append('            controlImage.style.borderRadius = "10%";')
+        html.append('            controlImage.style.margin = "0px 5px 0px 5px";')
+        html.append('            controlImage.style.verticalAlign = "middle";')
+        html.append('')
+        html.append('            var controlText = document.createElement("span");')
+        html.append('            controlText.style.color = "rgb(25,25,25)";')
+        html.append('            controlText.style.fontFamily = "Roboto,Arial,sans-serif";')
+        html.append('            controlText.style.fontSize = "11px";')
+        html.append('            controlText.style.lineHeight = "38px";')
+        html.append('            controlText.style.verticalAlign = "middle";')
+        html.append('            controlText.innerHTML = type.toString() + " " + ((type in sygicTypes) ? sygicTypes[type].name : "") + " (" + types[type] + ")";')
+        html.append('')
+        html.append('            var controlHolder = document.createElement("div");')
+        html.append('            controlHolder.style.paddingLeft = "5px";')
+        html.append('            controlHolder.style.paddingRight = "5px";')
+        html.append('            controlHolder.style.whiteSpace = "nowrap";')
+        html.append('')
+        html.append('            controlHolder.appendChild(controlCheckBox);')
+        html.append('            controlHolder.appendChild(controlImage);')
+        html.append('            controlHolder.appendChild(controlText);')
+        html.append('')
+        html.append('            controlUI.appendChild(controlHolder);')
+        html.append('        }')
+        html.append('')
+        html.append('        map.controls[google.maps.ControlPosition.LEFT_CENTER].push(centerControlDiv);')
+        html.append('    }')
+        html.append('</script>')
+        html.append('<script async defer src="https://maps.googleapis.com/maps/api/js?callback=initMap"></script>')
+        html.append('</body>')
+        html.append('</html>')
+
+        html_file.write('\n'.join(html))
+
+
+def _iter_new_batches(cursor, speedcams, db_is_new, batch_size=50000):
+    """
+    Yield (batch, positions of speedcams in batch not existing in OfflineSpeedcam yet, None - all)
+
+    Existence is checked by anti-join of batch in temp table against speedcamsLatLon index,
+    so memory does not depend on size of OfflineSpeedcam
+    """
+
+    speedcams = iter(speedcams)
 
-def igo2sygic(files, igo_types, debug):
+    if not db_is_new:
+        cursor.execute('CREATE INDEX IF NOT EXISTS speedcamsLatLon ON OfflineSpeedcam (Latitude, Longitude)')
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS Candidate (Position int not null, Latitude int not null, Longitude int not null)')
+
+    while True:
+        batch = list(itertools.islice(speedcams, batch_size))
+        if not batch:
+            break
+
+        if db_is_new:
+            yield batch, None
+            continue
+
+        cursor.execute('DELETE FROM temp.Candidate')
+        cursor.executemany('INSERT INTO temp.Candidate (Position, Latitude, Longitude) VALUES (?, ?, ?)', ((position, sc[LATITUDE], sc[LONGITUDE]) for position, sc in enumerate(batch)))
+        cursor.execute('SELECT Position FROM temp.Candidate c WHERE NOT EXISTS (SELECT 1 FROM OfflineSpeedcam o WHERE o.Latitude = c.Latitude AND o.Longitude = c.Longitude)')
+
+        yield batch, set(row[0] for row in cursor.fetchall())
+
+    if not db_is_new:
+        cursor.execute('DROP TABLE IF EXISTS temp.Candidate')
+
+
+def _sync_dat(cursor, speedcams, speed_limit_units, has_rtree=False, scope=None):
     """
-    SpeedCamText.txt
+    Apply keyed (Latitude, Longitude) diff between speedcams and records added by this script (Osm = 0):
+    delete records missing in speedcams, update changed ones. New records are left for insert.
 
-    header line: X, Y, TYPE, SPEED, DIRTYPE, DIRECTION
+    scope: (latitude, longitude) keys the diff is limited to, None - all records
 
-    X = longitude
-    Y = latitude
-    TYPE = type of speed camera ( 1 - fixed speed camera locations; 2 - combined red light and speed cameras; 3 - fixed red light camera locations; 4 - section camera positions; 5 - lasers, hand-held radars and other mobile speed camera locations; 6 - railway crossing; 7 - not constant mobile locations)
-    SPEED = speed limit in km/h
-    DIRTYPE = type of direction of the speedcam (0-all directions; 1-one direction; 2-both directions)
-    DIRECTION = direction in degrees (0-North; 90-East)
+    Return (deleted count, updated speedcams)
     """
 
-    speedcams = []  # [[latitude, longitude, speed, type], [...]]
+    cursor.execute('CREATE TEMP TABLE Incoming (Position int not null, Latitude int not null, Longitude int not null, Type byte not null, Angle int null, BothWays bit, SpeedLimit int, SpeedLimitUnits byte null, PRIMARY KEY (Latitude, Longitude))')
+    cursor.executemany('INSERT OR IGNORE INTO temp.Incoming (Position, Latitude, Longitude, Type, Angle, BothWays, SpeedLimit, SpeedLimitUnits) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', ((position, latitude, longitude, kind, angle, both_ways, speed_limit, speed_limit_units) for position, (latitude, longitude, speed_limit, kind, angle, both_ways) in enumerate(speedcams)))
 
-    for filename in files:
-        if not os.path.exists(filename):
-            continue
+    not_incoming = 'NOT EXISTS (SELECT 1 FROM temp.Incoming i WHERE i.Latitude = OfflineSpeedcam.Latitude AND i.Longitude = OfflineSpeedcam.Longitude)'
+
+    if scope is None:
+        missing = 'SELECT rowid FROM OfflineSpeedcam WHERE Osm = 0 AND ' + not_incoming
+    else:
+        cursor.execute('CREATE TEMP TABLE Scope (Latitude int not null, Longitude int not null, PRIMARY KEY (Latitude, Longitude))')
+        cursor.executemany('INSERT OR IGNORE INTO temp.Scope (Latitude, Longitude) VALUES (?, ?)', scope)
+        #CROSS JOIN keeps the small temp table as the outer loop
+        missing = 'SELECT OfflineSpeedcam.rowid FROM temp.Scope s CROSS JOIN OfflineSpeedcam ON OfflineSpeedcam.Latitude = s.Latitude AND OfflineSpeedcam.Longitude = s.Longitude WHERE OfflineSpeedcam.Osm = 0 AND ' + not_incoming
+
+    columns = ('Type', 'Angle', 'BothWays', 'SpeedLimit', 'SpeedLimitUnits')
+    changed = ' OR '.join('i.{column} IS NOT OfflineSpeedcam.{column}'.format(column=column) for column in columns)
+
+    #driven by Incoming through speedcamsLatLon index (CROSS JOIN fixes the order), so the rest of dat file is not scanned
+    changed_rows = 'FROM temp.Incoming i CROSS JOIN OfflineSpeedcam ON OfflineSpeedcam.Latitude = i.Latitude AND OfflineSpeedcam.Longitude = i.Longitude WHERE OfflineSpeedcam.Osm = 0 AND (' + changed + ')'
+
+    #partners of deleted and changed cameras lose the link (PairId is reciprocal), pair_sections links them again
+    cursor.execute('SELECT PairId FROM OfflineSpeedcam WHERE PairId IS NOT NULL AND rowid IN (' + missing + ' UNION ALL SELECT OfflineSpeedcam.rowid ' + changed_rows + ')')
+    partners = [row[0] for row in cursor.fetchall()]
+    if partners:
+        cursor.execute('CREATE TEMP TABLE Unpaired (Id int not null PRIMARY KEY)')
+        cursor.executemany('INSERT OR IGNORE INTO temp.Unpaired (Id) VALUES (?)', ((partner,) for partner in partners))
+        cursor.execute('UPDATE OfflineSpeedcam SET PairId = NULL WHERE Osm = 0 AND Id IN (SELECT Id FROM temp.Unpaired)')
+        cursor.execute('DROP TABLE temp.Unpaired')
+
+    if has_rtree:
+        cursor.execute('DELETE FROM rtree.SpeedcamIndex WHERE Id IN (' + missing + ')')
+
+    cursor.execute('DELETE FROM OfflineSpeedcam WHERE rowid IN (' + missing + ')')
+    deleted = cursor.rowcount
+
+    cursor.execute('SELECT i.Position ' + changed_rows + ' ORDER BY i.Position')
+    updated = Speedcams(speedcams[row[0]] for row in cursor.fetchall())
+
+    if updated:
+        incoming = 'FROM temp.Incoming i WHERE i.Latitude = OfflineSpeedcam.Latitude AND i.Longitude = OfflineSpeedcam.Longitude'
+        cursor.execute('UPDATE OfflineSpeedcam SET PairId = NULL, ' +
+                       ', '.join('{column} = (SELECT i.{column} {incoming})'.format(column=column, incoming=incoming) for column in columns) +
+                       ' WHERE rowid IN (SELECT OfflineSpeedcam.rowid ' + changed_rows + ')')
+
+    cursor.execute('DROP TABLE temp.Incoming')
+    if scope is not None:
+        cursor.execute('DROP TABLE temp.Scope')
+
+    return deleted, updated
+
+
+def save_dat(speedcams, dat_filename, unit, debug, sync=False, cache_size=64, rtree=False, sync_scope=None, keep_added=True):
+    """
+    Add speedcams not existing in dat file yet, return added (and updated) records
+
+    keep_added: False - return only their count, so memory does not grow with a stream of speedcams
+
+    sync: make records added by this script (Osm = 0) equal to speedcams, i.e. update changed ones and delete missing ones
+    sync_scope: (latitude, longitude) keys sync is limited to (speedcams are records of these keys), None - all
+    cache_size: SQLite page cache (and index sorter) size in MB
+    rtree: create R*Tree side index, existing one is always kept in sync
+    """
+
+    db_is_new = not os.path.exists(dat_filename)
+
+    speed_limit_units = 1 if unit == 'mph' else 0
+
+    conn = sqlite3.connect(dat_filename, isolation_level=None)
+
+    #one-shot build: new file can be simply rebuilt, existing one (with OfflineZone and stock records) keeps its journal
+    conn.execute('PRAGMA journal_mode = {}'.format('OFF' if db_is_new else 'DELETE'))
+    conn.execute('PRAGMA synchronous = {}'.format('OFF' if db_is_new else 'NORMAL'))
+    conn.execute('PRAGMA cache_size = {}'.format(-1024 * cache_size))
+
+    if db_is_new:
+        #indexes speedcamsLatLon and speedcamsId are created after load
+        db_schema = """
+                    CREATE TABLE Info (Version REAL not null, CreatedAt text not null, Note nvarchar(255) null);
+                    CREATE TABLE OfflineSpeedcam (Id int not null, Latitude int not null, Longitude int not null, Type byte not null, Angle int null, BothWays bit, SpeedLimit int, Osm bit, PairId int null, SpeedLimitUnits byte null);
+                    CREATE TABLE OfflineZone (Id int not null, Type byte not null, SpeedLimit smallint not null, LatitudeMin int not null, LongitudeMin int not null, LatitudeMax int not null, LongitudeMax int not null);
+                    """
+
+        conn.executescript(db_schema)
+
+    cursor = conn.cursor()
+
+    has_rtree = _attach_rtree(conn, dat_filename, rtree)
+
+    cursor.execute('BEGIN')
+    try:
+        if has_rtree and db_is_new:
+            #index of some previous dat file
+            cursor.execute('DELETE FROM rtree.SpeedcamIndex')
+
+        if not db_is_new:
+            #max(Id) and PairId partners by Id without full scan; built once for dat files made without it
+            cursor.execute('CREATE INDEX IF NOT EXISTS speedcamsId ON OfflineSpeedcam (Id)')
+
+        deleted, speedcams_updated = 0, Speedcams()
+        if sync and not db_is_new:
+            if not isinstance(speedcams, (list, Speedcams)):
+                speedcams = Speedcams(speedcams)
+            deleted, speedcams_updated = _sync_dat(cursor, speedcams, speed_limit_units, has_rtree, sync_scope)
+
+        cursor.execute('SELECT coalesce(max(rowid), 0) FROM OfflineSpeedcam')
+        max_rowid = cursor.fetchone()[0]
+
+        #get max id (speedcamsId index)
+        cursor.execute('SELECT coalesce(max(Id), 0) AS max_id FROM OfflineSpeedcam')
+        max_id = cursor.fetchone()[0]
+
+        #insert by batches, so speedcams can be a stream
+        speedcams_added = Speedcams()
+        added = 0
+        for batch, new_positions in _iter_new_batches(cursor, speedcams, db_is_new):
+            rows = []
+            for position, sc in enumerate(batch):
+                latitude, longitude, speed_limit, kind, angle, both_ways = sc
+
+                if new_positions is None or position in new_positions:
+                    max_id += 1
+                    rows.append((max_id, latitude, longitude, kind, angle, both_ways, speed_limit, speed_limit_units))
+                    added += 1
+                    if keep_added:
+                        speedcams_added.append(sc)
+                else:
+                    if debug and not sync:
+                        print('Already exists in db', (latitude, longitude))
+
+            if rows:
+                cursor.executemany('INSERT INTO OfflineSpeedcam (Id, Latitude, Longitude, Type, Angle, BothWays, SpeedLimit, Osm, PairId, SpeedLimitUnits) VALUES (?, ?, ?, ?, ?, ?, ?, 0, NULL, ?)', rows)
+
+        if has_rtree and added:
+            cursor.execute('INSERT INTO rtree.SpeedcamIndex (Id, MinLatitude, MaxLatitude, MinLongitude, MaxLongitude) SELECT rowid, Latitude, Latitude, Longitude, Longitude FROM OfflineSpeedcam WHERE rowid > ?', (max_rowid,))
+
+        if added or speedcams_updated or deleted:
+            cursor.execute('DELETE FROM Info')
+            cursor.execute('INSERT INTO Info (Version, CreatedAt, Note) VALUES (?, ?, NULL)', (2, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+        if db_is_new:
+            cursor.execute('CREATE INDEX speedcamsLatLon ON OfflineSpeedcam (Latitude, Longitude)')
+            cursor.execute('CREATE INDEX speedcamsId ON OfflineSpeedcam (Id)')
+
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+
+    conn.close()
+
+    if sync:
+        print('\nSpeedCameras sync: inserted {:,}; updated {:,}; deleted {:,}'.format(added, len(speedcams_updated), deleted))
 
         if debug:
-            print('\n' + filename)
+            for sc in speedcams_updated:
+                print('Updated in db', sc)
 
-        with (open(filename, 'rb') if bytes is str else open(filename, mode='r', newline='')) as csvfile:
-            speedcam_csv = csv.reader(csvfile, delimiter=str(','), quotechar=str('"'))
+        speedcams_added.extend(speedcams_updated)
+        added += len(speedcams_updated)
 
-            for row in speedcam_csv:
-                #omit header
-                if speedcam_csv.line_num == 1 and row[0] == 'X':
-                    continue
+    return speedcams_added if keep_added else added
 
-                #omit bad lines
-                if len(row) != 6:
-                    if debug:
-                        print(speedcam_csv.line_num, 'BAD LINE !!!', sep='; ')
-                    continue
 
-                longitude, latitude, kind, speed, dirtype, angle = row[0], row[1], row[2], row[3], row[4], row[5]
+def pair_average_speed(points, max_distance, max_angle=45):
+    """
+    Pair start and end cameras of average speed sections, return list of (index, index) pairs
 
-                #is latitude a float? if not, omit record
-                try:
-                    float(latitude)
-                except ValueError:
-                    if debug:
-                        print(speedcam_csv.line_num, 'Y', latitude, sep='; ')
+    points: (latitude, longitude, angle, both_ways, speed) of average speed cameras
+    Candidates have the same speed limit, are not farther than max_distance (meters) and, if both are one way,
+    have heading (angle) within max_angle and the end lies ahead of the start (bearing within 90 degrees of heading).
+    Points are bucketed into a grid with cell size max_distance, each point keeps its PAIR_CANDIDATES nearest
+    candidates, candidate pairs are then taken greedily by distance, so it is O(n log n) for usual densities.
+    """
+
+    if max_distance <= 0 or len(points) < 2:
+        return []
+
+    max_latitude = min(max(abs(point[0]) for point in points) / 100000.0, 89.0)
+    cell_latitude = max_distance / METERS_PER_UNIT
+    cell_longitude = cell_latitude / math.cos(math.radians(max_latitude))
+
+    grid = {}
+    for index, point in enumerate(points):
+        grid.setdefault((int(point[0] // cell_latitude), int(point[1] // cell_longitude)), []).append(index)
+
+    max_distance2 = (max_distance / METERS_PER_UNIT) ** 2
+
+    def heading_difference(a, b):
+        return abs((a - b + 180) % 360 - 180)
+
+    edges = set()
+    for index, (latitude, longitude, angle, both_ways, speed) in enumerate(points):
+        cos_latitude = math.cos(math.radians(latitude / 100000.0))
+        row, col = int(latitude // cell_latitude), int(longitude // cell_longitude)
+
+        candidates = []
+        for cell in ((r, c) for r in (row - 1, row, row + 1) for c in (col - 1, col, col + 1)):
+            for index2 in grid.get(cell, ()):
+                latitude2, longitude2, angle2, both_ways2, speed2 = points[index2]
+                if index2 == index or speed2 != speed:
                     continue
 
-                #is longitude a float? if not, omit record
-                try:
-                    float(longitude)
-                except ValueError:
-                    if debug:
-                        print(speedcam_csv.line_num, 'X', longitude, sep='; ')
+                dy, dx = latitude2 - latitude, (longitude2 - longitude) * cos_latitude
+                distance2 = dy ** 2 + dx ** 2
+                if distance2 > max_distance2:
                     continue
 
-                #is speed a integer? if not, try to find or set zero
-                if not speed.isdigit():
-                    #try to find first number in string
-                    speed = re.search('\d+|$', speed).group()
-                    if not speed.isdigit():
-                        speed = 0
-                    if debug:
-                        print(speedcam_csv.line_num, 'SPEED', row[3], speed, sep='; ')
-
-                if igo_types:
-                    #is type a integer? if not, set as normal speed camera - 1
-                    if not kind.isdigit():
-                        kind = '1'
-                        if debug:
-                            print(speedcam_csv.line_num, 'TYPE', row[2], kind, sep='; ')
-
-                    if kind in igo_types:
-                        kind = igo_types[kind]
-                    else:
-                        if debug and igo_types:
-                            print(speedcam_csv.line_num, 'TYPE', row[2], 'not defined in igotypes', sep='; ')
+                if not both_ways and not both_ways2:
+                    bearing = math.degrees(math.atan2(dx, dy)) % 360
+                    if heading_difference(angle, angle2) > max_angle or heading_difference(angle, bearing) > 90:
                         continue
-                else:
-                    kind = '1'
 
-                #igo dirtype equals 0 or 2: both ways; dirtype equals 1: single direction
-                both_ways = 0 if int(dirtype) == 1 else 1
+                candidates.append((distance2, index2))
 
-                #convert to sygic format
-                speedcams.append([int(float(latitude) * 100000), int(float(longitude) * 100000), int(speed), int(kind), int(angle), int(both_ways)])
+        for distance2, index2 in heapq.nsmallest(PAIR_CANDIDATES, candidates):
+            edges.add((distance2, min(index, index2), max(index, index2)))
 
-    #sort by latitude, longitude, speed
-    speedcams.sort(key=lambda x: (x[0], x[1], x[2]))
+    paired = set()
+    pairs = []
+    for distance2, index, index2 in sorted(edges):
+        if index not in paired and index2 not in paired:
+            paired.update((index, index2))
+            pairs.append((index, index2))
 
-    print('\nSpeedCameras all: {:,}'.format(len(speedcams)))
+    return pairs
 
-    #eliminate duplicates:
-    #append duplicated speed cameras to radars dict group by location
-    radars = {}  #radars[location: latitude,longitude] = [[index, latitude, longitude, speed, kind, angle, both_ways, delete_marker: 0 - ok; 1 - del], [...], [...]]
 
-    INDEX = 0
-    SPEED = 3
-    MARK = 7
+def pair_sections(dat_filename, max_distance, max_angle=45, debug=False):
+    """
+    Link average speed cameras added by this script (Osm = 0) into sections, write reciprocal PairId
 
-    speedcams2 = speedcams[:]
-    index1 = len(speedcams2)
-    while speedcams2:
-        index1 -= 1
+    Pairs are computed again for all of them, so removed or changed cameras do not leave stale links,
+    stock records keep their PairId. Return number of pairs.
+    """
 
-        latitude1, longitude1, speed1, kind1, angle1, both_ways1 = speedcams2.pop()
+    conn = sqlite3.connect(dat_filename, isolation_level=None)
+    cursor = conn.cursor()
 
-        location = str(latitude1) + ',' + str(longitude1)
+    cursor.execute('BEGIN')
+    try:
+        cursor.execute('SELECT rowid, Id, Latitude, Longitude, coalesce(Angle, 0), coalesce(BothWays, 1), coalesce(SpeedLimit, 0) FROM OfflineSpeedcam WHERE Type = ? AND Osm = 0 ORDER BY Latitude, Longitude', (AVERAGE_SPEED_TYPE,))
+        rows = cursor.fetchall()
 
-        if location in radars:
-            continue
+        pairs = pair_average_speed([row[2:] for row in rows], max_distance, max_angle)
 
-        index2 = index1
-        for speedcam2 in reversed(speedcams2):
-            index2 -= 1
-            latitude2, longitude2, speed2, kind2, angle2, both_ways2 = speedcam2
+        #also cameras which are not average speed ones any more
+        cursor.execute('UPDATE OfflineSpeedcam SET PairId = NULL WHERE Osm = 0 AND PairId IS NOT NULL')
+        cursor.executemany('UPDATE OfflineSpeedcam SET PairId = ? WHERE rowid = ?', [(rows[b][1], rows[a][0]) for a, b in pairs] + [(rows[a][1], rows[b][0]) for a, b in pairs])
 
-            if latitude1 == latitude2 and longitude1 == longitude2:
-                delete_marker = 0
-                if location not in radars:
-                    radars[location] = [[index1, latitude1, longitude1, speed1, kind1, angle1, both_ways1, delete_marker]]
-                radars[location].append([index2, latitude2, longitude2, speed2, kind2, angle2, both_ways2, delete_marker])
-            else:
-                break
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
 
-    #if exactly the same: leave first, mark rest to delete
-    for duplicates in radars.values():
-        for idx1 in range(len(duplicates)):
-            for idx2, radar in enumerate(duplicates):
-                if idx2 > idx1 and radar[SPEED] == duplicates[idx1][SPEED]:
-                    radar[MARK] = 1
+    conn.close()
 
-    def count2leave(duplicates):
-        return sum(1 for radar in duplicates if radar[MARK] == 0)
+    print('\nAverage speed sections: {:,} pairs of {:,} cameras'.format(len(pairs), len(rows)))
 
-    #one of speed is zero
-    for duplicates in radars.values():
-        if count2leave(duplicates) > 1:
-            for radar in duplicates:
-                if radar[SPEED] == 0:
-                    radar[MARK] = 1
+    if debug:
+        for a, b in pairs:
+            print('Paired', rows[a][1:], rows[b][1:])
 
-    #select lowest speed limit
-    for duplicates in radars.values():
-        if count2leave(duplicates) > 1:
-            minspeed = min([radar[SPEED] for radar in duplicates if radar[MARK] == 0])
-            for radar in duplicates:
-                if radar[MARK] == 0 and radar[SPEED] != minspeed:
-                    radar[MARK] = 1
+    return len(pairs)
 
-    if debug:
-        for location, duplicates in radars.items():
-            print('\n', location, count2leave(duplicates))
-            for radar in duplicates:
-                print(radar)
 
-    #delete marked
-    del_list = [radar[INDEX] for duplicates in radars.values() for radar in duplicates if radar[MARK] == 1]
-    del_list.sort(key=int, reverse=True)
-    [speedcams.pop(d) for d in del_list]
+def _hilbert_index(latitude, longitude, order=16):
+    """
+    Hilbert curve index of sygic coordinates on 2**order x 2**order grid (about 300 m cells for order 16)
+    """
 
-    return speedcams
+    side = 1 << order
+    x = (longitude + 18000000) * side // 36000001
+    y = (latitude + 9000000) * side // 18000001
 
+    index = 0
+    s = side >> 1
+    while s:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        index += s * s * ((3 * rx) ^ ry)
+        #rotate quadrant
+        if not ry:
+            if rx:
+                x, y = side - 1 - x, side - 1 - y
+            x, y = y, x
+        s >>= 1
 
-def dat2points(dat_filename):
-    if not os.path.exists(dat_filename):
-        return
+    return index
+
+
+def _dat_layout(conn):
+    layout = dict((key, conn.execute('PRAGMA ' + pragma).fetchone()[0]) for key, pragma in (('pages', 'page_count'), ('free_pages', 'freelist_count'), ('page_size', 'page_size')))
+    layout['rows'] = conn.execute('SELECT count(*) FROM OfflineSpeedcam').fetchone()[0]
+    return layout
+
+
+def optimize_dat(dat_filename):
+    """
+    Rewrite OfflineSpeedcam in Hilbert curve order of location, so that neighbouring speed cameras share pages,
+    then VACUUM and ANALYZE. Values of all rows (Id, Osm, PairId, ...), the indexes and OfflineZone stay the same,
+    rowids change, so R*Tree side index is rebuilt.
+
+    return (before, after) file size, pages and rows
+    """
 
     conn = sqlite3.connect(dat_filename, isolation_level=None)
+    conn.create_function(str('hilbert'), 2, _hilbert_index)
 
     cursor = conn.cursor()
 
-    cursor.execute('SELECT Latitude, Longitude, SpeedLimit, Type, Angle, BothWays FROM OfflineSpeedcam ORDER BY Latitude, Longitude')
+    before = _dat_layout(conn)
+    before['size'] = os.path.getsize(dat_filename)
 
-    return cursor.fetchall()
+    has_rtree = _attach_rtree(conn, dat_filename, False)
 
+    cursor.execute('BEGIN')
+    try:
+        table_sql = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'OfflineSpeedcam'").fetchone()[0]
+        indexes_sql = [row[0] for row in cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'OfflineSpeedcam' AND sql IS NOT NULL")]
 
-def points2map(speedcams):
-    html_filename = 'offlinespeedcams.dat_' + datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        #indexes are moved with renamed table and dropped with it
+        cursor.execute('ALTER TABLE OfflineSpeedcam RENAME TO OfflineSpeedcamUnordered')
+        cursor.execute(table_sql)
+        cursor.execute('INSERT INTO OfflineSpeedcam SELECT * FROM OfflineSpeedcamUnordered ORDER BY hilbert(Latitude, Longitude), Latitude, Longitude, rowid')
+        cursor.execute('DROP TABLE OfflineSpeedcamUnordered')
+        for index_sql in indexes_sql:
+            cursor.execute(index_sql)
 
-    html = []
-    html.append('<!DOCTYPE html>')
-    html.append('<html>')
-    html.append('<head>')
-    html.append('    <title>' + html_filename + '</title>')
-    html.append('    <meta charset="utf-8">')
-    html.append('    <style>')
-    html.append('        #map {')
-    html.append('            height: 100%;')
-    html.append('        }')
-    html.append('')
-    html.append('        html, body {')
-    html.append('            height: 100%;')
-    html.append('            margin: 0;')
-    html.append('            padding: 0;')
-    html.append('        }')
-    html.append('    </style>')
-    html.append('</head>')
-    html.append('<body>')
-    html.append('<div id="map"></div>')
-    html.append('<script>')
-    html.append('')
-    html.append('    var sygicTypes = {')
-    html.append('        0: {name: "RADAR_SYMBOL", symbol: "UE37A"},')
-    html.append('        1: {name: "RADAR_STATIC_SPEED", symbol: "UE37B"},')
-    html.append('        2: {name: "RADAR_STATIC_RED_LIGHT", symbol: "UE37E"},')
-    html.append('        3: {name: "RADAR_SEMIMOBILE_SPEED", symbol: "UE37B"},')
-    html.append('        4: {name: "RADAR_STATIC_AVERAGE_SPEED", symbol: "UE37C"},')
-    html.append('        5: {name: "RADAR_MOBILE_SPEED", symbol: "UE37B"},')
-    html.append('        6: {name: "RADAR_STATIC_RED_LIGHT_SPEED", symbol: "UE37E"},')
-    html.append('        7: {name: "RADAR_MOBILE_RED_LIGHT", symbol: "UE37E"},')
-    html.append('        8: {name: "RADAR_MOBILE_AVERAGE_SPEED", symbol: "UE37C"},')
-    html.append('        9: {name: "RADAR_FAV_COPS_PLACE", symbol: "UE37D"},')
-    html.append('        10: {name: "RADAR_INFO_CAMERA", symbol: "UE37A"},')
-    html.append('        11: {name: "RADAR_DANGEROUS_PLACE", symbol: "UE37A"},')
-    html.append('        12: {name: "RADAR_CONGESTION", symbol: "UE37F"},')
-    html.append('        13: {name: "RADAR_WEIGHT_CHECK", symbol: "UE37A"},')
-    html.append('        14: {name: "RADAR_DISTANCE_CHECK", symbol: "UE37A"},')
-    html.append('        15: {name: "RADAR_CLOSURE", symbol: "UE030"},')
-    html.append('        16: {name: "RADAR_SCHOOLZONE", symbol: "UE02E"}')
-    html.append('    };')
-    html.append('')
-    html.append('')
-    html.append(
-        '    var UE37A = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAACc0lEQVRo3u1Z0XXCMAyUuwErZAVWYAVWYIV0BBghHSGMACOwQjoCjHD9wPQ58jmxHYLTV+49fkC2JVk6SUbkjTeWBwBbAC36qAGsSusWo3yDMK4ANqV1zFXexbq0rkz5HVG0CxjVLSqcAKxseLhonN8rq3QvJ0rr7RpQK+UuRGZNbqIqrfvDuxqbgOxeybWl9RdCl+2ALAu1cqwEYJMaFiTZu5IGXHISk6zblVDe82QsNZKbu76UVm0sd1O8SOrD/pUGjNJmxB4VSej5aTWGNkmM02Qljji9wgB99Q2RaYkBp8B+OhTno9VA8lVEjvU/bWDP7dhNDeEj0QZNkwdjzDeRY9/d2IbGmKOInJ2vqlg6TgISChCJbQwpRfIqmlajbsBu5nl/YMlNEmBv0d1vJSLPo9VUtgBvMXYja1ifNH3wCfD1emQNa51H2YWE6XRajaHNgDeRYrSzVteQ7RTltSejk4sYEFVlyZn53SqAUyyTkLW9ApV4bpN7rrvJpL5dhcI1ca1OaFowkzyYGovq9pLDAD7zjebe0OJkNsC9RajtJ2tgIU4cJwJwPi7yegC/now7Ek8aNOzhjzzI7m3gd7a7IeFs2lT7sJkhN4z0Xr3RVfdC2tsHY0xSX2PBQi6rLbB90qfa23cGibfsAhLIo+yKCn8G9yODxNqkycg65GQPm/xsAr8u1VrA9VjykD434PdXrYjNAUuT7pWccw6ZEzYX3Ulv/WuA+API4v6AsE52yeGmBbz3/RwKnUn5mlTlhgn9JWxE+nXgS/hrwhJxMMb4eYp71btMdc3M6BVbE4o5uSdy/jj3XDyi4xh4h3rjjX+LH/cFw6xmLw4KAAAAAElFTkSuQmCC";')
-    html.append(
-        '    var UE37B = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAACXklEQVRo3u2Y23niMBSEZ/ZLA26BFtgSSAlJCaQEXIIpAUqAEuwScAlQAi5h9sGSI/T5im3sZP2/cJPFGV3OGQlYmCmS1pJ2ku6alpOkbVWcrAh+AyCeehA9EpLvjQIkBQCuAAIAKYDzxIGvANgZCEnua1ubZSNJVyNmcpyYLv5vbzXPJSQz08EKwMeL485IHs371Lyuuwiw6gMAF+RL6qVIgiOilD8t+gmmCN7571raCJg1P15A4x7oQeh9/kDJJpybgBTAnmRZ7dibhBDhO6/3ZsgltCf5tyJ4AADJjOQXgHcA2ZwEhCTDto1JJkOJGELA2S/vkraSYseQ3U01LdIiyRTA1xwEPIy8pBjAAcDG+dqu/aukYiOb5ZZMKeBM8uYEf/IC9wkAxMaaWGor7dgCrEeB8ext/FKAfIYsvWagLI3aLNKm49R5v2nRvmgrKTBZKZN0Q26bSyGZSApRsunfShrfANR77nK6Fql1y0GycZXGNBcr8bRZ7CvAHfW047MpUNj1yQS4677LZiwOSxjQVpQiadVwa7Bx2sZq5u6mUXN0rWI39gwAwMGpsJ+oX0oZgE9bOyRFqMk+r5oBmerrPrOTdPHaRK6VMHajicYZGEqATMCtUqmkgy/OfL/W40XaSwVYDnL2hdNPoIqbPq9d1EXAGCeyLYCtF1fjIDmeqlNKHfNI2YVY0hGPt3CDCRjk5NTACrnd7gzbNFLuNCOMcz9Ud5I7OgVv4ffhpbxnufeJoa+V6HUcHLCP5zHV8/TEyF8HqbQjCvMZxTbP5US2CPixLAKmZhGw8L/zD2iHYmmrdwfBAAAAAElFTkSuQmCC";')
-    html.append(
-        '    var UE37C = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAACpElEQVRo3u1Z7ZHiMAyVbq4BKIErgRZyJbAlpAWuBLYEKAFKCCWwJSQlQAlvfyCBosuHw9ohd8ubYZixZVlPkWXZJnrhHwCADECB8bAFsIhl/EKUngDMRnDWEsAZQBlL4UoI5KmNN3NuZM7er/AjQF/N6/J5U2Ej01xCyYYQ8MgSOn85dMAjBCaFFAQuRPSHiOYsIKJf0jZ5AgdmnjPzOzPf4piZK2Z+J6I5ER2nSmDHzG9dAsx8YebfMUnEIlCRCREAOYDSZJcCgF38bzQg04xBYKchA2BLRFsisjk8I6JC9xKR3U2JwFGMz4moa8OzJUKUMAohcKTr5/5oE2Bm7QvZI1byX3XIVDJfb5j97BNg5oqu2SMEIRtRb3nAzAciOoRMGCWEAKjhHwHi6vko1WasNaChE+K1gxszLlx6VJRaavcUe7nIzKRk9iieRQCSPlWmcx8AsG/R8VQCNRId4/cd459OQMNp7cbMAKxd2JS4nvZmRuckCIRib3TquhlMoHcfSIiVLOoL3Te39MD9vJoCm69b+B3x4LrozVghiFqNDkRI2TEOJBWeHslAkwXqV5FRwqUJr2uVZyPlRnag++KuvqLohf8KLl3aGj+TtnPDmLX0laZtYdotboejFMYvu3ZTQ27l2jWlro0eLa1zpz/dUdN4bCMGnK23TL89nc0M4UUTodFgap4F7jW892AtjAypUwOh5E9W1vjMGaJPT4WTq4VRQ/ioHpgxNQyxa8hGdotrMUbvdTLnSb02WUnIaExHuQt9GGi+BoH1rsjpq+bZhE/R0O+zmG2PG1omXNQo/ek6ODl5DSMNn7ylv4Tc6jkCcd6IzYR6FeLTpl2QS9Pu87t/6fTp2CMegbZP3uDNTcuYfYveJf6+IyqF/HjZ6YXvjk9KkDD5QQnRFAAAAABJRU5ErkJggg==";')
-    html.append(
-        '    var UE37D = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAADIUlEQVRo3uVZ23XiMBC9k5MGSAluwSnBW4JTAlsClMCWQEqAEkwJUIIpwZRw84FsxrL8kmxDzt6fBCTNW6OZAfifQXJN8kByE0gnJ7khGS+tQME7DgE0Ij6wG3v+LVCHk/mbBNDQVr9MroCxUJuAJcNVgPv1uZNrA8nU2zwmxkly7yKs3L8OpH92rMUkz2Z9vJctAWliPlXrK/N97mslc3kb94jk3uKd+3ogVZe1xIFkVCrhRbjJZ6X45Q5+/nyMpQ/aGlMJ3mIwp8enIl54xeM4Pvtgq/96GGsnPXs2nAb5EK8afsO8otIXjUs31vquQ6A+xbOWc7G1LzZCa1n674RKjzb2ak/OdvgqsLNkKBx7aum26yX+ArAFcFPfHdX/N8wIEbmh/jKfjDz/RhMz1rBDKJ4o/ls9RzKh5ws/VKldmLwVps33AwQ/BArswpkefYWMFD4CkAGI1NcXPO7GVUSOA+jEeJTgEQAdJlcAXyIyurQeooBOZ5lRaCraMR+ZrZiSdslAP1reHVgPj5VS4hxO8UFYt32zFXKGV6J4BfXamqiuzWct5Bz8wkKJ9Rcxm1t4wzOo0beJ6dhfJlejVm4UQSGrcn6xlPCG7zrYcKwXdXsvIv4K6NBtDaM361CtkQaghb4uqYAp5sqCMWW9gq26wtpLbIRuww3AVkS+rTMp6i9zivqsx4VvyyBHEbladHcAutLoUUS+RB2IAPiNLp6Di4h86hDSLvsNaK+52N1tPRu1Cy0O4WMA09Uh0+MmIh/lB1dLaZcKVwCfIiIA/mCZbHQE8GF4/rXWugfJbDYrkbU+RyupkTtkssc36y4FdPyfB+wJmtSxOUDeOPbYRqvugSuExlZ/FxE5jTxTwdHBDal73HvongfZw6bEWg/qnhweGBJCWRfBRkyWShjhl0ixGR/j9rVjveoI3x063CwXRQDO7KwyJkcCoOjgWWVC1x3onSq8ACoZXQrY48RXw1aPXBoKWGXsyyP0d+Kn4z2cRDD0ZC/GvZ8IA5s/cdrYc4bZEO/TiL65a/+rz/uDVrZwmXlIZp8HOeRY80lTkcXwA9Aco7XKju/lAAAAAElFTkSuQmCC";')
-    html.append(
-        '    var UE37E = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAACQElEQVRo3u2a4XHiQAyFP91cA1wJbsFXApRgSvCVQEpISoASoARcAikhlBBKePeD9cDl7DXBWrOZyZvJ8EO7jN5Kq30SgW98YUgqJe01Ds+Pcr6Q9D7S+RaHe/34MYJDDcyczqOUVE9NoIzYdsDCrgA8AafInsLpMG5DJPdXkT0zSYeefet7/BgTgS68mNlLn9HMTsCSeCQeS2BogZkdgU2OBF7DCd+0NkcCn0mLLFPoMyXVq/y6Eigl3epYeeO6SQkArIYWSCo4P4J5Eoi9qCFCWzJNoRZrSVtJ/6RJIHbAMX0AfiYgAFABlaREX39BighMilQRgLN4u8Y8/LkiRQQa4FfQRO2DtTOzBWcdlAd61Ogh2KoO2z6o0S7b3WrUm8A84uA1wb0XAW8x1xB/zEpJFZmq0Tbfh+p8QaZi7iORSeAq5sJnM7DulUzF3CzIhVjzvgn3JFsx1w6pFvwfiScz+xMGWdNOILoQmUq8h0rTtWcdKbF3ldEUUmIGbCWduDT5rj1AagLXRJLPPVOr0R3DE7nHQPGpdN2xvgiNjusd8I7ACfgNNB8u7BtQmtkSRxkxCj0RqMNJv8Ui02N/eAROZrbhLOb66vxa56lElmKuHRdWA+sqMh0ttnAbmUxNoHV86HSPniS9R4sF8RH70cx2DKdZeijeE6+6bKFCufbE3lKilLQ1s6WkDRf9czSznaQ54Nq8p7jEVXi4aqAJ45UinPCe/vyfVm5IepYvkqjVGIEsfugeS+Lr/qvBN5zwF1uu96Vz+2R8AAAAAElFTkSuQmCC";')
-    html.append(
-        '    var UE37F = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAACh0lEQVRo3u1Y23GjQBDsuXICXAikwIWAQ5BDIAU5BCkEOwQRghSCFIIIQQ6h/cEsN2Bgd0ESdXV0lUrFY96zO70AK1asWLHif4b4XiC5AZDqrxh4rQLwCQAisl86KOv8B2t8aCBD721J7vTdK8lkad+dUxxzvEcmU5nD0s6nLvMzAs+WDGCyEyST2Mo9IoAryfMM+aetgRdj1O02lf6/T1UqIl/PCqAByRvbWK4FItDMAZLsPLsAKM11BqAvqC8AewAnEbksFgnJDach7+ixMyEWB5WPX0PG6EGvM9NWaYB8qov/Xsj9XptFjHrhAsAJAETkQvICIEfdJmPOJwCORkdDLQCUIlKNyOao2xNqyzl+JPknuC1JnjXyY08FesvdUz2S3EaXf7iS1xjB2PKnxqDDbo7zxpfM6AxLCP9O3xBsjZwjfOHZCvMnTi/J3OP0mZ3dgTVtcG1WBBkKD8BWdnAm/fLoqVBP5HcAbz0TNgeQoF7kJe4IXfhOp5+TaTbPnawXPe8VLiNm8Uaz1hCoLVf9rflNY7ocHnazdp4Re9mAvYZovkTqHIq8YM1EStQtZYfQ2FHUydi9vhKRUpMyNMyateg9E3cy4obOBiF9eX843lWJSBkdgAnkZrPwZLSms28X6nM+W9B5oNNW0QF0FFSaEQHwijZnOkkEALx17Oz1/m8oP1PMa10zIX/sPmxzougDkZG9de4n5llrMk+pwDPaZ4z9eqm9L0sHmw03VJSKWPYa9W3IDC2Hnd5PSB7tg7kBxJC+R6D1tWRKC5WeEj8ara8l0QEoyVoygNbpbkoF/n3wJ2u1mE0xOHyUvc3V7QwMnZfvwkp7djTqddCXihUrVqxYEYxvjk3SBt4cZTYAAAAASUVORK5CYII=";')
-    html.append(
-        '    var UE02E = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAAC7klEQVRo3u1Y3XnrIAyFbuAVvIJX8ApZIXcE3xHcEdIR3BGSEbyCM4I7wrkPhUYoAoTJT+/3RS+JAQkdJMQBY17ykpf812JrDQBojTE79/lhrf16Niit4x2AFaGsALpn+6YFcIQsh2f7pgWwRgAsj/TjrUK3KWz/dQDOhe2/DsBnpP39kQCqBMBQU4FcJRsADM8CsCcA5gK9BsDMNr9a/xaOdwAOUgVyK9pk9AfIstP6UON8bHK1MwkbY6k/RZvY0QZtvk6J3I5VqvuW4Eja5GQU7DQPTyEA7QbnvRwEeyMbs9579acKAJDSie2F4vwvcb4vXXHI6dYyu5QQrgD29wJw1HhNZCbAab3vFRGdOdBa5/lKxlhodLWJTq+M6KIF8ZZwvHUrScP61+hLHa0oX4k+SVrzXYazc4kA8F3OZmMM5TbvzrBWqO6Z/WrKZWeMKb8csZRZ8V0pWmwro42z6fO9AbArtKEneszJPgGsaHKv6/6PCr0R4V7TH3BugwWEDOVl1Mvq9L0zA/m/pICzObczVcivD0VRiOinSOGBRX37KY1r3l4cBVwuLhNpaxI6RyHy24ketuV/sNoRu1HQZIyPXt3h5lZxyboayoJEFcno+grmN33dtVMI+ZKIzIxM5cikEHA5tTvStp0rIbz//kwgTAIoXucEHS57MraPRaDkRhbkoLX2RD7PJqQLmteJnn3/ic1nrT1Za8XnmhIAtAoE3Ma9SNN3og7sIBSEgvy01n4YY06R/npBSKlnoZ9TjTFhi+d/69p5mt7uvQhhBRojY+imPiZsUT40MWD00Ftxq7uBtGLCmE4JgPIhzrk4bZlMrTCjh8zYWQHghw8p5gNqXytI/q/Iv7qNKQAsSql9QvfDkptX45BqJXAhaWukn96Fu4ytSQNWWqEB1ywym4su9Fc83m3OgRWCLMNkRUFXkRBnn0tGT6LHU64vY9MD1lMIXEiUj4JPoTWhE7vwSOeFt9sr7eUOxJe8pEb+ARnn4rUoLVH1AAAAAElFTkSuQmCC";')
-    html.append('    var UE030 = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAAABGdBTUEAALGPC/xhBQAAACBjSFJNAAB6JgAAgIQAAPoAAACA6AAAdTAAAOpgAAA6mAAAF3CculE8AAAABmJLR0QAAAAAAAD5Q7t/AAAB1UlEQVRo3u1Z25HCMAyUmWsgLdACLdBCWqCFtJAWaAFKgBKOEqCEUMLex5kZjyPbimPH8V32iwxE3pXWyA+iDRtmQaUIAmBPRK1+7B0/uxLRg4heSqlraeEf4h2AJ+LQAziUJJ4KF13BRYgfZ2Q8hK6mrLtwA9DkIH8WDN5rkXtHjA6yOfNMaqkA+W8Ap4iYh0DcNCI8thliiDuE3DzJibcTgHYpn3oSdYkN2Di8ek5JXJiw6ZV2+DMuG/NFDJMqDmDP+TE3eWN8zk7yHuHI/qItX0/g6VXQ3rfRC8ZMLYBzQbgKTPmm+S+tCNsJYRvjd2FVNPsGlwNThSb00lDS+wwfey6M/lJ3pmIiMhW+lVKPkgKI6G49j5YXO8+XdyoPO4EjR/gEvLiIyAeu49ocvBWw8S6XeDmHnSTKmvGnBRRpYAEOI0t9GZ/tCcP2AKVUkrMkIexJOxJgVkAkYGHYHPx9ienEx5LsmU7chl6w10LZdmAC8lFroVPtq9GGsVGJ/QCXfdmuDDXvyPTLde+JdZCeCVLHqYQOVPe5UCDg+k/mBIHXfzZqDFLv6bRQxAef+4HGEaPM/YBFIDfy3NAYIuq9I8tYjeVuKR1Cit4T/++b+g0J8AM1HTteeD/mQgAAAABJRU5ErkJggg==";')
-    html.append('')
-    html.append('    var map;')
-    html.append('    var markers = [];')
-    html.append('    var types = {};')
-    html.append('')
-    html.append('    function initMap() {')
-    html.append('        map = new google.maps.Map(document.getElementById("map"), {')
-    html.append('            zoom: 5,')
-    html.append('            center: new google.maps.LatLng(48.208775, 16.372477)')
-    html.append('        });')
-    html.append('')
-    html.append('        var speedCams = [')
-
-    for sc in speedcams:
-        latitude, longitude, speed_limit, kind, angle, both_ways = sc
-
-        latitude = str(float(latitude) / 100000)
-        longitude = str(float(longitude) / 100000)
-
-        html.append('{y:' + latitude + ',x:' + longitude + ',s:' + str(speed_limit) + ',t:' + str(kind) + '},')
-
-    html.append('        ];')
-    html.append('')
-    html.append('        speedCams.forEach(function (speedCam) {')
-    html.append('')
-    html.append('            types[speedCam.t] = (speedCam.t in types) ? types[speedCam.t] += 1 : 1;')
-    html.append('')
-    html.append('            markers.push(')
-    html.append('                new google.maps.Marker({')
-    html.append('                    map: map,')
-    html.append('                    position: new google.maps.LatLng(speedCam.y, speedCam.x),')
-    html.append('                    title: "SPEED: " + speedCam.t + "; TYPE: " + speedCam.t + ";",')
-    html.append('                    type: speedCam.t,')
-    html.append('                    visible: false')
-    html.append('                }));')
-    html.append('        });')
-    html.append('')
-    html.append('        function markersShowHide(type, visible) {')
-    html.append('            console.log(type, visible);')
-    html.append('            markers.forEach(function (marker) {')
-    html.append('                if (marker.type == type) {')
-    html.append('                    marker.setVisible(visible);')
-    html.append('                }')
-    html.append('            });')
-    html.append('        }')
-    html.append('')
-    html.append('        var controlUI = document.createElement("div");')
-    html.append('        controlUI.style.backgroundColor = "#fff";')
-    html.append('        controlUI.style.border = "2px solid #fff";')
-    html.append('        controlUI.style.borderRadius = "3px";')
-    html.append('        controlUI.style.boxShadow = "0 2px 6px rgba(0,0,0,.3)";')
-    html.append('        controlUI.style.lineHeight = "35px";')
-    html.append('        controlUI.style.marginLeft = "10px";')
-    html.append('        controlUI.style.textAlign = "left";')
-    html.append('        controlUI.title = "Filter markers";')
-    html.append('')
-    html.append('        var centerControlDiv = document.createElement("div");')
-    html.append('        centerControlDiv.index = 1;')
-    html.append('        centerControlDiv.appendChild(controlUI);')
-    html.append('')
-    html.append('        for (var type in types) {')
-    html.append('            var controlCheckBox = document.createElement("input");')
-    html.append('            controlCheckBox.value = type;')
-    html.append('            controlCheckBox.type = "checkbox";')
-    html.append('            controlCheckBox.checked = false;')
-    html.append('            controlCheckBox.style.margin = "0px 5px 0px 5px";')
-    html.append('            controlCheckBox.style.verticalAlign = "middle";')
-    html.append('')
-    html.append('            controlCheckBox.addEventListener("click", function () {')
-    html.append('                markersShowHide(this.value, this.checked);')
-    html.append('            });')
-    html.append('')
-    html.append('            var controlImage = document.createElement("img");')
-    html.append('            controlImage.src = (type in sygicTypes) ? eval(sygicTypes[type].symbol) : UE37A;')
-    html.append('            controlImage.width = "24";')
-    html.append('            controlImage.height = "24";')
-    html.append('            controlImage.style.backgroundColor = "rgba(0,0,0,0.7)";')
-    html.append('            controlImage.style.borderRadius = "10%";')
-    html.append('            controlImage.style.margin = "0px 5px 0px 5px";')
-    html.append('            controlImage.style.verticalAlign = "middle";')
-    html.append('')
-    html.append('            var controlText = document.createElement("span");')
-    html.append('            controlText.style.color = "rgb(25,25,25)";')
-    html.append('            controlText.style.fontFamily = "Roboto,Arial,sans-serif";')
-    html.append('            controlText.style.fontSize = "11px";')
-    html.append('            controlText.style.lineHeight = "38px";')
-    html.append('            controlText.style.verticalAlign = "middle";')
-    html.append('            controlText.innerHTML = type.toString() + " " + ((type in sygicTypes) ? sygicTypes[type].name : "") + " (" + types[type] + ")";')
-    html.append('')
-    html.append('            var controlHolder = document.createElement("div");')
-    html.append('            controlHolder.style.paddingLeft = "5px";')
-    html.append('            controlHolder.style.paddingRight = "5px";')
-    html.append('            controlHolder.style.whiteSpace = "nowrap";')
-    html.append('')
-    html.append('            controlHolder.appendChild(controlCheckBox);')
-    html.append('            controlHolder.appendChild(controlImage);')
-    html.append('            controlHolder.appendChild(controlText);')
-    html.append('')
-    html.append('            controlUI.appendChild(controlHolder);')
-    html.append('        }')
-    html.append('')
-    html.append('        map.controls[google.maps.ControlPosition.LEFT_CENTER].push(centerControlDiv);')
-    html.append('    }')
-    html.append('</script>')
-    html.append('<script async defer src="https://maps.googleapis.com/maps/api/js?callback=initMap"></script>')
-    html.append('</body>')
-    html.append('</html>')
+        if has_rtree:
+            #recreating is faster than deleting all entries, rowid order is spatial now
+            cursor.execute('DROP TABLE rtree.SpeedcamIndex')
+            cursor.execute('CREATE VIRTUAL TABLE rtree.SpeedcamIndex USING rtree_i32(Id, MinLatitude, MaxLatitude, MinLongitude, MaxLongitude)')
+            cursor.execute('INSERT INTO rtree.SpeedcamIndex (Id, MinLatitude, MaxLatitude, MinLongitude, MaxLongitude) SELECT rowid, Latitude, Latitude, Longitude, Longitude FROM OfflineSpeedcam')
 
-    with open(html_filename + '.html', 'w') as html_file:
-        html_file.write('\n'.join(html))
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
 
+    cursor.execute('VACUUM')
+    if has_rtree:
+        cursor.execute('VACUUM rtree')
+    cursor.execute('ANALYZE')
 
-def save_dat(speedcams, dat_filename, unit, debug):
-    db_is_new = not os.path.exists(dat_filename)
+    after = _dat_layout(conn)
+    conn.close()
+    after['size'] = os.path.getsize(dat_filename)
 
-    speed_limit_units = 1 if unit == 'mph' else 0
+    print('\nOptimized {}: size {:,} -> {:,} bytes; pages {:,} -> {:,} (free {:,} -> {:,})'.format(dat_filename, before['size'], after['size'], before['pages'], after['pages'], before['free_pages'], after['free_pages']))
 
-    conn = sqlite3.connect(dat_filename, isolation_level=None)
+    return before, after
 
-    if db_is_new:
-        db_schema = """
-                    CREATE TABLE Info (Version REAL not null, CreatedAt text not null, Note nvarchar(255) null);
-                    CREATE TABLE OfflineSpeedcam (Id int not null, Latitude int not null, Longitude int not null, Type byte not null, Angle int null, BothWays bit, SpeedLimit int, Osm bit, PairId int null, SpeedLimitUnits byte null);
-                    CREATE TABLE OfflineZone (Id int not null, Type byte not null, SpeedLimit smallint not null, LatitudeMin int not null, LongitudeMin int not null, LatitudeMax int not null, LongitudeMax int not null);
 
-                    CREATE INDEX speedcamsLatLon ON OfflineSpeedcam (Latitude, Longitude);                    
-                    """
+def _watch_snapshot(directory, mask):
+    """
+    {path: (size, mtime)} of files matching mask in directory tree, hidden files and directories are skipped
+    """
 
-        conn.executescript(db_schema)
-        conn.commit()
+    snapshot = {}
+    for dir_path, dir_names, file_names in os.walk(directory):
+        dir_names[:] = [dir_name for dir_name in dir_names if not dir_name.startswith('.')]
+        for file_name in file_names:
+            if file_name.startswith('.') or not fnmatch.fnmatch(file_name, mask):
+                continue
+            filename = os.path.join(dir_path, file_name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                #removed meanwhile
+                continue
+            snapshot[filename] = (stat.st_size, stat.st_mtime)
 
-    cursor = conn.cursor()
+    return snapshot
 
-    #get max id
-    cursor.execute('SELECT coalesce(max(Id), 0) AS max_id FROM OfflineSpeedcam')
-    max_id = cursor.fetchone()[0]
 
-    cursor.execute('SELECT Latitude, Longitude FROM OfflineSpeedcam ORDER BY Id')
+def _watch_parse(filename, igo_types, debug, cache_dir):
+    """
+    Parse one watched file, None if it failed (logged), so changes of other files are still applied
+    """
+
+    try:
+        return file2points(filename, igo_types, debug, cache_dir)[0]
+    except Exception as e:
+        print('\n{} {} not applied, previous records kept until it changes: {}: {}'.format(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), filename, type(e).__name__, e))
+        return None
 
-    offspeedcams = cursor.fetchall()
 
-    offspeedcams = set(offspeedcams)
+def watch(directory, mask, dat_filename, unit, igo_types, debug, interval=1.0, debounce=2.0, cache_dir=None, rtree=False, pair_distance=0, rebuilds=None, cache_max_size=None):
+    """
+    Keep dat file in sync with IGO files in directory: records added by this script (Osm = 0) mirror the files
 
-    #generate SQL
-    speedcams_added = []
-    sql = []
-    for sc in speedcams:
-        latitude, longitude, speed_limit, kind, angle, both_ways = sc
+    Directory is polled every interval seconds, a burst of changes is applied once nothing changed for debounce seconds.
+    Only changed files are parsed again and only records at locations of their old and new records are deduplicated
+    again (with records of other files at the same locations) and synced by save_dat in one transaction.
+    A file which fails to parse keeps its previous records until it changes again, other files are applied.
+    A failed rebuild (e.g. locked dat file) is logged and retried on the next poll.
 
-        if (latitude, longitude) not in offspeedcams:
-            max_id += 1
-            sql.append('INSERT INTO OfflineSpeedcam (Id, Latitude, Longitude, Type, Angle, BothWays, SpeedLimit, Osm, PairId, SpeedLimitUnits) VALUES ({Id}, {Latitude}, {Longitude}, {Type}, {Angle}, {BothWays}, {SpeedLimit}, 0, NULL, {SpeedLimitUnits});'.format(Id=max_id, Latitude=latitude, Longitude=longitude, SpeedLimit=speed_limit, Type=kind, Angle=angle, BothWays=both_ways, SpeedLimitUnits=speed_limit_units))
-            speedcams_added.append(sc)
-        else:
-            if debug:
-                print('Already exists in db', (latitude, longitude))
+    rebuilds: stop after this number of rebuilds, None - run until interrupted
+    cache_max_size: cache is evicted to this size (bytes) after each rebuild, None - not evicted
+    """
+
+    snapshot = _watch_snapshot(directory, mask)
+
+    #sorted, so order of files (and so result of dedup) does not depend on directory listing
+    parsed = {}
+    speedcams = Speedcams()
+    for filename in sorted(snapshot):
+        records = _watch_parse(filename, igo_types, debug, cache_dir)
+        if records is not None:
+            parsed[filename] = records
+            speedcams.extend(records)
+
+    speedcams = _sort_and_dedup(speedcams, debug, Stats())
+    save_dat(speedcams, dat_filename, unit, debug, sync=True, rtree=rtree)
+    if pair_distance > 0:
+        pair_sections(dat_filename, pair_distance, debug=debug)
+
+    print('\nWatching {} ({} files, {:,} speed cameras)'.format(directory, len(parsed), len(speedcams)))
+
+    count = 0
+    while rebuilds is None or count < rebuilds:
+        time.sleep(interval)
+
+        current = _watch_snapshot(directory, mask)
+        if current == snapshot:
+            continue
+
+        #debounce: wait until a burst of changes settles
+        while True:
+            time.sleep(debounce)
+            latest = _watch_snapshot(directory, mask)
+            if latest == current:
+                break
+            current = latest
+
+        started = time.time()
+
+        changed = sorted(filename for filename in set(snapshot) | set(current) if snapshot.get(filename) != current.get(filename))
+
+        try:
+            #old and new records of changed files, their locations are deduplicated and synced again
+            current_parsed = dict(parsed)
+            changed_records = Speedcams()
+            for filename in changed:
+                records = Speedcams()
+                if filename in current:
+                    records = _watch_parse(filename, igo_types, debug, cache_dir)
+                    if records is None:
+                        #previous records of the file stay until it changes again
+                        continue
+                    current_parsed[filename] = records
+                else:
+                    current_parsed.pop(filename, None)
+
+                if filename in parsed:
+                    changed_records.extend(parsed[filename])
+                changed_records.extend(records)
+
+            parse_time = time.time() - started
+
+            affected = Speedcams()
+            for filename in sorted(current_parsed):
+                affected.extend(current_parsed[filename].at(changed_records))
+            affected.sort()
+            affected = eliminate_duplicates(affected, debug)
+
+            speedcams_changed = save_dat(affected, dat_filename, unit, debug, sync=True, rtree=rtree, sync_scope=changed_records.locations())
+            if pair_distance > 0:
+                pair_sections(dat_filename, pair_distance, debug=debug)
+        except Exception as e:
+            #snapshot and parsed records stay old, so the rebuild is done again
+            print('\n{} rebuild failed, retrying: {}: {}'.format(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), type(e).__name__, e))
+            continue
+
+        parsed = current_parsed
+        snapshot = current
+        count += 1
+
+        if cache_max_size is not None:
+            evict_cache(cache_dir, cache_max_size)
+
+        print('\n{} rebuild: {} files changed; {:,} changed records; {:,} added or updated; parse {:.2f}s; total {:.2f}s'.format(
+            datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), len(changed), len(changed_records), len(speedcams_changed), parse_time, time.time() - started))
+
+
+def load_targets(config_filename, unit):
+    """
+    Targets config (JSON): list of {"dat": path, "bbox": [min latitude, min longitude, max latitude, max longitude], "files": [patterns], "unit": "kmh" | "mph"}
+
+    bbox, files (fnmatch patterns of source path or name) and unit are optional, unit defaults to --unit
+    """
+
+    with open(config_filename) as config_file:
+        targets = json.load(config_file)
+
+    if not isinstance(targets, list) or not targets:
+        raise ValueError('targets config must be a non-empty list')
+
+    dat_filenames = set()
+    for target in targets:
+        if not isinstance(target, dict) or not target.get('dat'):
+            raise ValueError('target without dat: {}'.format(target))
+        if os.path.abspath(target['dat']) in dat_filenames:
+            raise ValueError('target dat listed twice: {}'.format(target['dat']))
+        dat_filenames.add(os.path.abspath(target['dat']))
+
+        target.setdefault('unit', unit)
+        if target['unit'] not in ('kmh', 'mph'):
+            raise ValueError('target unit must be kmh or mph: {}'.format(target['dat']))
+        if target.get('bbox') is not None and len(target['bbox']) != 4:
+            raise ValueError('target bbox needs 4 values: {}'.format(target['dat']))
+
+    return targets
+
+
+def _target_files(target, files):
+    patterns = target.get('files')
+    if not patterns:
+        return files
 
-    if sql:
-        sql.insert(0, 'BEGIN;')
-        sql.append('DELETE FROM Info;')
-        sql.append('INSERT INTO Info (Version, CreatedAt, Note) VALUES ({version}, "{createdAt}", NULL);'.format(version=2, createdAt=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-        sql.append('COMMIT;')
-        conn.executescript(''.join(sql))
+    return [filename for filename in files if any(fnmatch.fnmatch(filename, pattern) or fnmatch.fnmatch(os.path.basename(filename), pattern) for pattern in patterns)]
 
-    return speedcams_added
+
+def _save_target_worker(task):
+    """
+    Pool worker: merge nearby, save and optimize speedcams of one target, return dat filename, counts and time
+    """
+
+    speedcams, target, merge_radius, debug, sync, rtree, optimize, pair_distance = task
+
+    started = time.time()
+    if merge_radius > 0:
+        speedcams = merge_nearby(speedcams, merge_radius, debug)
+    speedcams_added = save_dat(speedcams, target['dat'], target['unit'], debug, sync, rtree=rtree)
+    if pair_distance > 0:
+        pair_sections(target['dat'], pair_distance, debug=debug)
+    if optimize:
+        optimize_dat(target['dat'])
+
+    return target['dat'], len(speedcams), len(speedcams_added), time.time() - started
+
+
+def igo2sygic_targets(files, targets, igo_types, debug, jobs=1, cache_dir=None, stats=None, merge_radius=0, sync=False, rtree=False, optimize=False, pair_distance=0):
+    """
+    Build many dat files from one parse of files
+
+    Records of all files are sorted and deduplicated once and partitioned by target bbox,
+    a target with its own subset of files is deduplicated on that subset (the same as a separate run with those files).
+    Targets are written in worker processes.
+
+    return list of (dat filename, speedcams, speedcams added, seconds)
+    """
+
+    stats = stats or Stats()
+
+    parsed = []
+
+    with stats.stage('parse') as stage:
+        _parse_files(files, igo_types, debug, jobs, cache_dir, stats.rejects, lambda filename, points: parsed.append((filename, points)))
+        stage['rows'] = sum(len(points) for filename, points in parsed)
+
+    cleaned = {}
+
+    def clean(subset):
+        key = tuple(subset)
+        if key not in cleaned:
+            subset = set(subset)
+            speedcams = Speedcams()
+            for filename, points in parsed:
+                if filename in subset:
+                    speedcams.extend(points)
+            speedcams.sort()
+            cleaned[key] = eliminate_duplicates(speedcams, debug)
+        return cleaned[key]
+
+    tasks = []
+    with stats.stage('sort+dedup+partition') as stage:
+        for target in targets:
+            speedcams = clean(_target_files(target, files))
+            if target.get('bbox') is not None:
+                speedcams = speedcams.within(target['bbox'])
+            tasks.append((speedcams, target, merge_radius, debug, sync, rtree, optimize, pair_distance))
+        stage['rows'] = sum(len(task[0]) for task in tasks)
+
+    #parsed files are not needed any more, only partitions are sent to workers
+    del parsed[:]
+    cleaned.clear()
+
+    with stats.stage('write targets') as stage:
+        processes = min(len(tasks), jobs if jobs > 1 else multiprocessing.cpu_count())
+        if processes > 1:
+            pool = multiprocessing.Pool(processes)
+            try:
+                results = pool.map(_save_target_worker, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_save_target_worker(task) for task in tasks]
+        stage['rows'] = sum(result[1] for result in results)
+
+    return results
 
 
 if __name__ == '__main__':
     import argparse
-    import fnmatch
     import locale
 
     arg_parser = argparse.ArgumentParser(description='Sygic offlinespeedcams.dat generator. Convert Speed Camera / Photo Radar from IGO to Sygic', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
-    arg_parser.add_argument('-t', '--type', choices=['igo'], default='igo', help='Input type')
+    arg_parser.add_argument('-t', '--type', choices=['igo', 'osm'], default='igo', help='Input type: IGO SpeedCamText.txt or OSM XML (.osm, .osm.bz2, .osm.gz)')
     arg_parser.add_argument('-d', '--dat', type=str, default='offlinespeedcams.dat', help='DAT file')
     arg_parser.add_argument('-u', '--unit', choices=['kmh', 'mph'], default='kmh', help='Unit: kmh or mph')
     arg_parser.add_argument('-it', '--igotypes', action=type(str(''), (argparse.Action,), dict(__call__=lambda self, parser, namespace, values, option_string: getattr(namespace, self.dest).update(dict([v.split('=') for v in values.replace(';', ',').split(',') if len(v.split('=')) == 2])))), default={'1': '1', '2': '6', '3': '2', '4': '4', '5': '5', '6': '2', '7': '2', '8': '11', '9': '16', '10': '10', '11': '6', '12': '2', '13': '10', '15': '12', '17': '9', '31': '11'}, metavar='KEY1=VAL1,KEY2=VAL2;KEY3=VAL3...', dest='igo_types', help='You can specific your own types, first IGO, second Sygic')
-    arg_parser.add_argument('--debug', action='store_true', help='Print debug data')
-    arg_parser.add_argument('--map', action='store_true', default=True, help='Generate Google Maps with added points')
+    arg_parser.add_argument('--targets', type=str, metavar='CONFIG', help='Build many dat files from one parse, JSON list of {"dat": path, "bbox": [minlat, minlon, maxlat, maxlon], "files": [patterns], "unit": "kmh"}, -d and map are not used')
+    arg_parser.add_argument('--sync', action='store_true', default=False, help='Update changed and delete missing speed cameras previously added by this script')
+    arg_parser.add_argument('--cache-dir', type=str, default='.offlinespeedcams_cache', help='Cache of parsed source files')
+    arg_parser.add_argument('--cache-size', type=int, default=256, metavar='MB', help='Cache size limit, least recently used files are evicted')
+    arg_parser.add_argument('--no-cache', action='store_true', default=False, help='Do not use cache of parsed source files')
+    arg_parser.add_argument('--max-memory', type=int, default=0, metavar='MB', help='Streaming mode for huge inputs: keep about MB of parsed records in memory, spill the rest to sorted temporary files, 0 - off')
+    arg_parser.add_argument('--debug', action='store_true', help='Print debug data, rejected rows are written to --rejects file')
+    arg_parser.add_argument('--stats', action='store_true', default=False, help='Print time, rows, rows/sec and peak memory of each stage and counts of rejected rows')
+    arg_parser.add_argument('--stats-json', type=str, metavar='FILE', help='Write --stats report to FILE as JSON')
+    arg_parser.add_argument('--rejects', type=str, metavar='FILE', help='Write rejected and coerced source rows (file; line; reason; values) to FILE, source files are parsed without cache (default with --debug: offlinespeedcams_rejects.txt)')
+    arg_parser.add_argument('-r', '--merge-radius', type=float, default=0, metavar='METERS', help='Merge speed cameras closer than METERS to each other, 0 - off')
+    arg_parser.add_argument('-p', '--pair-distance', type=float, default=0, metavar='METERS', help='Link average speed cameras not farther than METERS with the same heading and speed limit into sections (PairId), 0 - off')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=1, help='Parse source files in N worker processes')
+    arg_parser.add_argument('--map', action='store_true', default=True, help='Generate Google Maps with added points (default)')
+    arg_parser.add_argument('--no-map', dest='map', action='store_false', help='Do not generate Google Maps, with --max-memory added points are not kept in memory')
     arg_parser.add_argument('--dat2map', action='store_true', default=False, help='Generate Google Maps with points from offlinespeedcams.dat')
+    arg_parser.add_argument('--watch', type=str, metavar='DIR', help='Keep DAT in sync with IGO files in DIR, changed files are applied incrementally, until interrupted')
+    arg_parser.add_argument('--watch-mask', type=str, default='*.*', help='--watch only files matching mask')
+    arg_parser.add_argument('--watch-interval', type=float, default=1.0, metavar='SECONDS', help='--watch polling interval')
+    arg_parser.add_argument('--debounce', type=float, default=2.0, metavar='SECONDS', help='--watch applies changes once files did not change for SECONDS')
+    arg_parser.add_argument('--export-bin', type=str, metavar='FILE', help='Write cleaned speed cameras to binary snapshot FILE')
+    arg_parser.add_argument('--import-bin', type=str, metavar='FILE', help='Read cleaned speed cameras from binary snapshot FILE instead of source files')
+    arg_parser.add_argument('--rtree', action='store_true', default=False, help='Create R*Tree side index (DAT.rtree) for fast --bbox / --around queries, existing one is always updated')
+    arg_parser.add_argument('--optimize', action='store_true', default=False, help='Rewrite DAT in spatial (Hilbert curve) order, VACUUM and ANALYZE, works also without source files')
+    arg_parser.add_argument('--bbox', type=lambda value: [float(v) for v in value.split(',')], metavar='MINLAT,MINLON,MAXLAT,MAXLON', help='--dat2map only points in bounding box')
+    arg_parser.add_argument('--around', type=lambda value: [float(v) for v in value.split(',')], metavar='LAT,LON,RADIUS', help='--dat2map only points within RADIUS meters')
 
     arg_parser.add_argument('files', nargs='*', help='Source files')
 
     args = arg_parser.parse_args()
 
+    if args.bbox and len(args.bbox) != 4 or args.around and len(args.around) != 3:
+        arg_parser.error('--bbox needs 4 values, --around needs 3 values')
 
-    def list_dir(cur_dir, mask, files_list):
-        cur_dir = os.path.normpath(cur_dir)
-
-        for f in os.listdir(cur_dir):
-            file_name = os.path.normpath(os.path.join(cur_dir, f))
-            if not f.startswith('.') and os.path.isdir(file_name):
-                list_dir(file_name, mask, files_list)
-            if f.startswith('.'):
-                continue
-            if fnmatch.fnmatch(f, mask) and os.path.isfile(file_name):
-                files_list.append(file_name)
-
-
-    all_files = []
+    names = []
     for filename in args.files:
-
         try:
             if type(filename) == unicode:
                 filename = unicode(filename, locale.getpreferredencoding())
         except:
             filename = str(filename)
+        names.append(filename)
+
+    if args.max_memory and (args.merge_radius > 0 or args.sync or args.targets):
+        arg_parser.error('--max-memory cannot be used with --merge-radius, --sync or --targets, they need all records in memory')
+
+    if args.watch and (args.type != 'igo' or args.max_memory or args.targets or args.merge_radius > 0 or args.files):
+        arg_parser.error('--watch works with IGO files of DIR only, without --max-memory, --targets and --merge-radius')
+
+    if (args.export_bin or args.import_bin) and (args.max_memory or args.targets or args.watch):
+        arg_parser.error('--export-bin and --import-bin cannot be used with --max-memory, --targets or --watch')
+    if args.import_bin and args.files:
+        arg_parser.error('--import-bin replaces source files')
+
+    if args.type == 'osm' and (args.max_memory or args.targets):
+        arg_parser.error('--type osm cannot be used with --max-memory or --targets')
+
+    targets = None
+    if args.targets:
+        try:
+            targets = load_targets(args.targets, args.unit)
+        except (IOError, ValueError) as e:
+            arg_parser.error('--targets {}: {}'.format(args.targets, e))
+
+    if args.debug and not args.rejects:
+        args.rejects = 'offlinespeedcams_rejects.txt'
+
+    #reject details are written while parsing
+    rejects_file = open(args.rejects, 'w') if args.rejects else None
+    stats = Stats(rejects_file or False)
+
+    #files are parsed while the rest of them is still being discovered, the first one is found here,
+    #the rest in background thread started when parsing gets to the second one (after worker processes are forked)
+    source_files = iter_source_files(names)
+    first_file = next(source_files, None)
+    all_files = itertools.chain([first_file], iter_prefetched(source_files)) if first_file is not None else None
+
+    if args.watch:
+        try:
+            watch(os.path.abspath(args.watch), args.watch_mask, args.dat, args.unit, args.igo_types, args.debug, args.watch_interval, args.debounce,
+                  None if args.no_cache else args.cache_dir, args.rtree, args.pair_distance, cache_max_size=args.cache_size * 1024 * 1024)
+        except KeyboardInterrupt:
+            pass
+
+    elif args.type == 'igo' and all_files and args.max_memory:
+        #half of memory for parsed records, half for SQLite
+        speedcams = igo2sygic_stream(all_files, args.igo_types, args.debug, max(args.max_memory * 1024 * 1024 // 2 // RUN_RECORD_SIZE, RUN_BLOCK), stats)
 
-        filename = os.path.abspath(os.path.normpath(filename))
+        #records are merged and deduplicated while save_dat consumes the stream
+        with stats.stage('merge+dedup+save_dat') as stage:
+            #added records are kept for the map only
+            speedcams_added = save_dat(speedcams, args.dat, args.unit, args.debug, cache_size=max(args.max_memory // 2, 2), rtree=args.rtree, keep_added=args.map)
+            stage['rows'] = len(speedcams_added) if args.map else speedcams_added
 
-        if os.path.isfile(filename):
-            all_files.append(filename)
+        print('\nSpeedCameras added: {:,}'.format(stage['rows']))
+
+        if args.map and speedcams_added:
+            with stats.stage('map') as stage:
+                points2map(speedcams_added)
+                stage['rows'] = len(speedcams_added)
+
+    elif args.type == 'igo' and all_files and targets:
+        cache_dir = None if args.no_cache or args.rejects else args.cache_dir
+
+        with stats.stage('discovery') as stage:
+            all_files = list(all_files)
+            stage['rows'] = len(all_files)
+
+        results = igo2sygic_targets(all_files, targets, args.igo_types, args.debug, args.jobs, cache_dir, stats, args.merge_radius, args.sync, args.rtree, args.optimize, args.pair_distance)
+
+        evict_cache(cache_dir, args.cache_size * 1024 * 1024)
+
+        print('')
+        for dat_filename, count, added, elapsed in results:
+            print('{}: SpeedCameras {:,}; {}: {:,} ({:.2f}s)'.format(dat_filename, count, 'added or updated' if args.sync else 'added', added, elapsed))
+
+    elif all_files or args.import_bin:
+        if args.import_bin:
+            with stats.stage('import snapshot') as stage:
+                try:
+                    with Snapshot(args.import_bin) as snapshot:
+                        speedcams = snapshot.to_speedcams()
+                except (IOError, ValueError) as e:
+                    arg_parser.error('--import-bin: {}'.format(e))
+                stage['rows'] = len(speedcams)
+        elif args.type == 'osm':
+            speedcams = osm2sygic(all_files, args.unit, args.debug, stats)
         else:
-            if os.path.isdir(filename):
-                list_dir(os.path.dirname(filename), '*.*', all_files)
-            else:
-                list_dir(os.path.dirname(filename), os.path.basename(filename), all_files)
+            #rejects are not stored in cache
+            cache_dir = None if args.no_cache or args.rejects else args.cache_dir
 
-    if args.type == 'igo' and all_files:
-        speedcams = igo2sygic(all_files, args.igo_types, args.debug)
+            speedcams = igo2sygic(all_files, args.igo_types, args.debug, args.jobs, cache_dir, stats)
+
+            evict_cache(cache_dir, args.cache_size * 1024 * 1024)
 
         print('\nSpeedCameras after cleaning: {:,}'.format(len(speedcams)))
 
-        speedcams_added = save_dat(speedcams, args.dat, args.unit, args.debug)
+        if args.export_bin:
+            with stats.stage('export snapshot') as stage:
+                export_snapshot(speedcams, args.export_bin, OSM_TYPES if args.type == 'osm' else args.igo_types)
+                stage['rows'] = len(speedcams)
+
+        if args.merge_radius > 0:
+            with stats.stage('merge nearby') as stage:
+                speedcams = merge_nearby(speedcams, args.merge_radius, args.debug)
+                stage['rows'] = len(speedcams)
 
-        print('\nSpeedCameras added: {:,}'.format(len(speedcams_added)))
+            print('\nSpeedCameras after merging: {:,}'.format(len(speedcams)))
+
+        with stats.stage('save_dat') as stage:
+            speedcams_added = save_dat(speedcams, args.dat, args.unit, args.debug, args.sync, rtree=args.rtree)
+            stage['rows'] = len(speedcams_added)
+
+        print('\nSpeedCameras {}: {:,}'.format('added or updated' if args.sync else 'added', len(speedcams_added)))
 
         if args.map and speedcams_added:
-            points2map(speedcams_added)
+            with stats.stage('map') as stage:
+                points2map(speedcams_added)
+                stage['rows'] = len(speedcams_added)
+
+    if args.pair_distance > 0 and not targets and os.path.exists(args.dat):
+        with stats.stage('pair sections') as stage:
+            stage['rows'] = pair_sections(args.dat, args.pair_distance, debug=args.debug)
+
+    if args.optimize and not targets and os.path.exists(args.dat):
+        with stats.stage('optimize') as stage:
+            before, after = optimize_dat(args.dat)
+            stage['rows'] = after['rows']
 
     if args.dat2map:
-        dat_points = dat2points(args.dat)
-        if dat_points:
-            points2map(dat_points)
+        with stats.stage('dat2map') as stage:
+            dat_points = Speedcams(dat2points(args.dat, args.bbox, args.around))
+            if dat_points:
+                points2map(dat_points)
+            stage['rows'] = len(dat_points)
+
+    if args.rejects:
+        rejects_file.close()
+
+        print('\nRejected or coerced rows: {:,} ({})'.format(sum(stats.rejects.counts.values()), args.rejects))
+
+    if args.stats:
+        stats.print_report()
+    if args.stats_json:
+        with open(args.stats_json, 'w') as stats_file:
+            json.dump(stats.report(), stats_file, indent=2, sort_keys=True)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, absolute_import, unicode_literals
+
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import offlinespeedcams
+
+
+class EliminateDuplicatesTest(unittest.TestCase):
+    """
+    eliminate_duplicates and iter_unique give the same records as the reference implementation
+    """
+
+    def random_speedcams(self, rnd):
+        #few locations and speeds, so most records have duplicates, some of them exactly the same
+        speedcams = [[rnd.randrange(4), rnd.randrange(4), rnd.choice([0, 0, 30, 50, 50, 70]), rnd.randrange(3), rnd.randrange(3), rnd.randrange(2)]
+                     for _ in range(rnd.randrange(1, 60))]
+        speedcams.sort(key=lambda sc: (sc[0], sc[1], sc[2]))
+        return speedcams
+
+    def test_random_cases(self):
+        rnd = random.Random(0)
+        for case in range(300):
+            speedcams = self.random_speedcams(rnd)
+
+            expected = offlinespeedcams.eliminate_duplicates_reference(speedcams, False)
+
+            self.assertEqual([list(sc) for sc in offlinespeedcams.eliminate_duplicates(speedcams, False)], expected, case)
+            self.assertEqual([list(sc) for sc in offlinespeedcams.iter_unique(speedcams)], expected, case)
+
+    def test_reference_accepts_speedcams(self):
+        speedcams = self.random_speedcams(random.Random(1))
+        original = [list(sc) for sc in speedcams]
+
+        expected = offlinespeedcams.eliminate_duplicates_reference(speedcams, False)
+
+        self.assertEqual(speedcams, original)
+        self.assertEqual(offlinespeedcams.eliminate_duplicates_reference(offlinespeedcams.Speedcams(speedcams), False), expected)
+
+
+class IgoFileTest(unittest.TestCase):
+    """
+    Bad rows of IGO files are rejected and counted, the rest of the file is parsed
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_bad_direction(self):
+        filename = os.path.join(self.directory, 'speedcam.txt')
+        with open(filename, 'w') as igo_file:
+            igo_file.write('X,Y,TYPE,SPEED,DIRTYPE,DIRECTION\n16.1,48.1,1,50,0,\n16.2,48.2,1,50,x,90\n16.3,48.3,1,70,1,90\n')
+
+        rejects = offlinespeedcams.Rejects()
+        speedcams = list(offlinespeedcams.iter_igo_file(filename, {'1': '1'}, False, rejects))
+
+        self.assertEqual(speedcams, [(4830000, 1630000, 70, 1, 90, 0)])
+        self.assertEqual(rejects.counts, {'bad direction': 2})
+
+
+class SyncDatTest(unittest.TestCase):
+    """
+    save_dat(sync=True) makes records added by this script (Osm = 0) equal to the sources, stock records and OfflineZone stay
+    """
+
+    #latitude, longitude, speed, type, angle, both_ways
+    A = (100, 100, 50, 1, 0, 1)
+    B = (200, 200, 50, 1, 0, 1)
+    C = (300, 300, 80, 4, 90, 0)
+    D = (400, 400, 80, 4, 90, 0)
+    E = (600, 600, 30, 2, 0, 1)
+    #Id, latitude, longitude, type, angle, both_ways, speed, Osm, PairId, SpeedLimitUnits; the second one is not in the sources
+    STOCK = [(100, 500, 500, 1, 0, 1, 40, 1, None, 0), (101, 700, 700, 2, 0, 1, 0, 1, 101, 0)]
+    ZONE = (1, 1, 50, 0, 0, 1000, 1000)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dat = os.path.join(self.directory, 'offlinespeedcams.dat')
+
+        offlinespeedcams.save_dat([self.A, self.B, self.C, self.D], self.dat, 'kmh', False)
+
+        conn = sqlite3.connect(self.dat)
+        conn.executemany('INSERT INTO OfflineSpeedcam (Id, Latitude, Longitude, Type, Angle, BothWays, SpeedLimit, Osm, PairId, SpeedLimitUnits) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', self.STOCK)
+        conn.execute('INSERT INTO OfflineZone VALUES (?, ?, ?, ?, ?, ?, ?)', self.ZONE)
+        #sections A - B and C - D
+        for latitude, pair_latitude in ((100, 200), (200, 100), (300, 400), (400, 300)):
+            conn.execute('UPDATE OfflineSpeedcam SET PairId = (SELECT Id FROM OfflineSpeedcam WHERE Latitude = ?) WHERE Latitude = ?', (pair_latitude, latitude))
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def rows(self, osm):
+        conn = sqlite3.connect(self.dat)
+        try:
+            return conn.execute('SELECT Latitude, Longitude, SpeedLimit, Type, Angle, BothWays, PairId FROM OfflineSpeedcam WHERE Osm = ? ORDER BY Latitude, Longitude', (osm,)).fetchall()
+        finally:
+            conn.close()
+
+    def sync(self):
+        #B is missing, C is changed, E is new, a camera at location of the stock record differs from it
+        changed_c = self.C[:2] + (60,) + self.C[3:]
+        at_stock = (500, 500, 90, 2, 0, 1)
+        return offlinespeedcams.save_dat([self.A, changed_c, self.D, at_stock, self.E], self.dat, 'kmh', False, sync=True)
+
+    def test_update_delete_insert(self):
+        changed = self.sync()
+
+        self.assertEqual(sorted(changed), [(300, 300, 60, 4, 90, 0), self.E])
+        self.assertEqual([row[:6] for row in self.rows(0)], [self.A, (300, 300, 60, 4, 90, 0), self.D, self.E])
+
+    def test_stock_records_and_zones_untouched(self):
+        self.sync()
+
+        conn = sqlite3.connect(self.dat)
+        try:
+            self.assertEqual(conn.execute('SELECT Id, Latitude, Longitude, Type, Angle, BothWays, SpeedLimit, Osm, PairId, SpeedLimitUnits FROM OfflineSpeedcam WHERE Osm != 0').fetchall(),
+                             self.STOCK)
+            self.assertEqual(conn.execute('SELECT * FROM OfflineZone').fetchall(), [self.ZONE])
+            #the camera at location of the stock record is neither updated nor inserted
+            self.assertEqual(conn.execute('SELECT count(*) FROM OfflineSpeedcam WHERE Latitude = 500 AND Longitude = 500').fetchone(), (1,))
+        finally:
+            conn.close()
+
+    def test_pair_id_cleared(self):
+        self.sync()
+
+        pair_ids = dict((row[0], row[6]) for row in self.rows(0))
+
+        #A: partner B deleted, C: changed, D: partner C changed, E: new
+        self.assertEqual(pair_ids, {100: None, 300: None, 400: None, 600: None})
+
+
+if __name__ == '__main__':
+    unittest.main()